@@ -0,0 +1,65 @@
+"""
+Measure simulated-detector frame rate and memory churn of generate_measured_image.
+
+Compares the old expression, ``ideal + np.random.random(shape) * level``,
+with SampleLibrary.measure allocating its result and filling a preallocated
+frame, in float64 and float32. Memory churn is reported as the peak memory
+allocated during one frame, in units of one float64 frame, as traced by
+tracemalloc.
+
+    python benchmarks/bench_measured_image.py --shape 2048 2048
+"""
+import argparse
+import pathlib
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# Import utils the same way the notebook does, from its directory.
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from utils.generate_data import SampleLibrary  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--shape", type=int, nargs=2, default=(1024, 1024))
+    parser.add_argument("--frames", type=int, default=50)
+    args = parser.parse_args()
+
+    library = SampleLibrary(seed=0, shape=args.shape)
+    ideal = library.ideal_pattern(1)
+    level = library.noise_level(1)
+    frame_bytes = ideal.nbytes
+    buffer64 = np.empty(ideal.shape)
+    buffer32 = np.empty(ideal.shape, dtype=np.float32)
+
+    def old():
+        return ideal + np.random.random(ideal.shape) * level
+
+    cases = [
+        ("old: ideal + random * level", old),
+        ("measure()", lambda: library.measure(1)),
+        ("measure(dtype=float32)", lambda: library.measure(1, dtype=np.float32)),
+        ("measure(out=float64 buffer)", lambda: library.measure(1, out=buffer64)),
+        ("measure(out=float32 buffer)", lambda: library.measure(1, out=buffer32)),
+    ]
+    print(f"frames of {tuple(args.shape)}, {frame_bytes / 2 ** 20:.1f} MiB in float64")
+    for label, measure in cases:
+        measure()  # warm up
+        t0 = time.perf_counter()
+        for _ in range(args.frames):
+            measure()
+        rate = args.frames / (time.perf_counter() - t0)
+
+        tracemalloc.start()
+        measure()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        churn = peak / frame_bytes
+        print(f"{label:30} {rate:8.1f} frames/s   peak {churn:4.2f} frames")
+
+
+if __name__ == "__main__":
+    main()
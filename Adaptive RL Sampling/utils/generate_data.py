@@ -1,10 +1,34 @@
-import random
+import functools
 import numpy as np
 
 
 def make_random_peaks(
-    x, xmin=None, xmax=None, peak_chance=0.1, return_pristine_peaks=False
+    x,
+    xmin=None,
+    xmax=None,
+    peak_chance=0.1,
+    return_pristine_peaks=False,
+    size=None,
+    rng=None,
 ):
+    """
+    Generate a 1D intensity profile with randomly placed peaks.
+
+    Pass size to generate that many profiles at once, as a (size, len(x))
+    array. The random draws are the same as for size separate calls. Pass a
+    numpy Generator as rng to draw from it instead of the global state.
+    """
+    if rng is None:
+        rng = np.random
+
+    # make peak positions
+    shape = len(x) if size is None else (size, len(x))
+    peak_pos = rng.random(shape) < peak_chance
+    return _peak_profiles(x, peak_pos, xmin, xmax)
+
+
+def _peak_profiles(x, peak_pos, xmin=None, xmax=None):
+    "Intensity profiles with a peak wherever peak_pos is True."
 
     # select boundaries for peaks
     if xmin is None:
@@ -12,15 +36,17 @@ def make_random_peaks(
     if xmax is None:
         xmax = np.percentile(x, 90)
 
-    y = np.zeros(len(x))
-
-    # make peak positions
-    peak_pos = np.array(np.random.random(len(x)) < peak_chance)
-    peak_pos[x < xmin] = False
-    peak_pos[x > xmax] = False
+    peak_pos = peak_pos.copy()
+    peak_pos[..., x < xmin] = False
+    peak_pos[..., x > xmax] = False
 
-    for peak_idex in [i for i, x in enumerate(peak_pos) if x]:
-        y += gaussian(x, c=x[peak_idex], sig=0.1, amp=(1 / x[peak_idex]) ** 0.5)
+    # Sum one Gaussian per peak as a single (n_peaks, len(x)) computation,
+    # over only the positions where some profile has a peak.
+    used = peak_pos.reshape(-1, len(x)).any(axis=0)
+    centers = x[used]
+    peaks = gaussian(x, c=centers[:, np.newaxis], sig=0.1, amp=1.0)
+    weights = peak_pos[..., used] * (1 / centers) ** 0.5
+    y = weights @ peaks
 
     # now for any diffuse low-Q component
     y += gaussian(x, c=0, sig=3, amp=0.1)
@@ -46,51 +72,279 @@ def gaussian(x, c=0, sig=1, amp=None):
 #     return np.broadcast_to(np.repeat(values, 20)[: shape[0]], shape).copy()
 
 
-def generate_ideal_image(x, intensity, shape):
-    """
-    Given a 1D array of intensity, generate a 2D diffraction image.
-    """
+@functools.lru_cache(maxsize=8)
+def _unit_radius(shape):
+    "Distance of each pixel from the center, scaled to 1 at the corners."
     xL, yL = shape[0] // 2, shape[1] // 2  # half-lengths of each dimension
     x_, y_ = np.mgrid[-xL:xL, -yL:yL]
     ordinal_r = np.hypot(x_, y_)
     unit_r = ordinal_r / ordinal_r.max()
-    r = unit_r * x.max()
-    return np.interp(r, x, intensity)
+    unit_r.flags.writeable = False
+    return unit_r
+
+
+def generate_ideal_image(x, intensity, shape):
+    """
+    Given a 1D array of intensity, generate a 2D diffraction image.
+
+    Given a 2D (N, len(x)) array of intensities, generate N images as an
+    (N, *shape) array. All images share one radius map and one set of
+    interpolation weights.
+    """
+    r = _unit_radius(tuple(shape)) * x.max()
+    intensity = np.asarray(intensity)
+    if intensity.ndim == 1:
+        return np.interp(r, x, intensity)
+    # np.interp for many profiles at once. x is increasing and r lies
+    # within [x.min(), x.max()].
+    hi = np.clip(np.searchsorted(x, r), 1, len(x) - 1)
+    lo = hi - 1
+    w = (r - x[lo]) / (x[hi] - x[lo])
+    return intensity[:, lo] * (1 - w) + intensity[:, hi] * w
 
 
 def generate_noise_image(shape, noise_level):
     return np.random.random(shape) * noise_level
 
 
-# At global scope, define 9 samples that we will base this demo/tutorial on.
-
 SHAPE = (128, 128)
 x = np.linspace(0, 30, num=101)
 
+
+def generate_samples(num_samples, x=x, shape=SHAPE, peak_chance=0.2):
+    """
+    Generate the 1D intensities and ideal 2D patterns of many samples at once.
+
+    Parameters
+    ----------
+    num_samples : int
+    x : array, optional
+    shape : tuple, optional
+    peak_chance : float, optional
+
+    Returns
+    -------
+    intensities : array
+        (num_samples, len(x))
+    ideal_patterns : array
+        (num_samples, *shape). At the default shape, this is 128 kB per sample.
+    """
+    intensities = make_random_peaks(x, peak_chance=peak_chance, size=num_samples)
+    intensities *= 1000.0
+    return intensities, generate_ideal_image(x, intensities, shape)
+
+
+class SampleLibrary:
+    """
+    A reproducible rack of simulated samples.
+
+    Which samples are "good" (low noise) is decided on construction. Each
+    sample's ideal pattern is generated on first use, from its own random
+    stream, and cached, so the patterns do not depend on the order in which
+    samples are visited. Measurement noise is drawn from a Generator that
+    belongs to the library. Libraries with the same seed produce the same
+    measurements in any process.
+
+    Parameters
+    ----------
+    num_samples : int, optional
+        Default is 9.
+    seed : int, optional
+        If None, fresh entropy is used; it is kept in ``seed`` so the
+        library can be recreated.
+    x : array, optional
+    shape : tuple, optional
+    peak_chance : float, optional
+
+    Examples
+    --------
+    >>> library = SampleLibrary(1000, seed=42)
+    >>> image, noise_level = library.measure(17)
+    >>> library.save("rack.npz")
+    >>> library = SampleLibrary.load("rack.npz")
+    """
+
+    def __init__(
+        self, num_samples=9, seed=None, *, x=x, shape=SHAPE, peak_chance=0.2
+    ):
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.num_samples = num_samples
+        self.x = x
+        self.shape = tuple(shape)
+        self.peak_chance = peak_chance
+        self._intensities = {}
+        self._ideal_patterns = {}
+        self.rng = np.random.default_rng(self._seed_sequence(0))
+        # Decide that a third to two thirds of these samples are "good".
+        # The first one (0) is always good and the second one (1) is always
+        # bad. For 9 samples this is 3-6 good ones.
+        layout = np.random.default_rng(self._seed_sequence(1))
+        low, high = max(num_samples // 3 - 1, 0), max(2 * num_samples // 3 - 1, 0)
+        others = np.arange(2, num_samples)
+        size = min(layout.integers(low, high + 1), len(others))
+        self.good_seeds = [0] + sorted(
+            layout.choice(others, size=size, replace=False).tolist()
+        )
+
+    def _seed_sequence(self, *key):
+        return np.random.SeedSequence(self.seed, spawn_key=key)
+
+    def __len__(self):
+        return self.num_samples
+
+    def is_good(self, sample_number):
+        return sample_number in self.good_seeds
+
+    def generate(self, sample_numbers=None):
+        """
+        Generate and cache the patterns of many samples in one batch.
+
+        By default, all samples not generated yet.
+        """
+        if sample_numbers is None:
+            sample_numbers = range(self.num_samples)
+        todo = [i for i in sample_numbers if i not in self._ideal_patterns]
+        if not todo:
+            return
+        for i in todo:
+            if not 0 <= i < self.num_samples:
+                raise IndexError(f"No sample {i} in a library of {self.num_samples}.")
+        # Profiles are computed one sample at a time so that they are
+        # bit-for-bit independent of which samples share the batch.
+        intensities = np.array(
+            [
+                make_random_peaks(
+                    self.x,
+                    peak_chance=self.peak_chance,
+                    rng=np.random.default_rng(self._seed_sequence(2, i)),
+                )
+                for i in todo
+            ]
+        )
+        intensities *= 1000.0
+        patterns = generate_ideal_image(self.x, intensities, self.shape)
+        for i, intensity, pattern in zip(todo, intensities, patterns):
+            intensity.flags.writeable = False
+            pattern.flags.writeable = False
+            self._intensities[i] = intensity
+            self._ideal_patterns[i] = pattern
+
+    def intensity(self, sample_number):
+        "The 1D intensity profile of a sample"
+        self.generate([sample_number])
+        return self._intensities[sample_number]
+
+    def ideal_pattern(self, sample_number):
+        "The noiseless 2D pattern of a sample"
+        self.generate([sample_number])
+        return self._ideal_patterns[sample_number]
+
+    def noise_level(self, sample_number):
+        if self.is_good(sample_number):
+            return 100  # low noise
+        else:
+            return 800  # high noise
+
+    def measure(self, sample_number, out=None, dtype=np.float64):
+        """
+        Return a noisy image of a sample, and its noise level.
+
+        The image is computed in place, in out if given, without any
+        full-frame temporary arrays.
+
+        Parameters
+        ----------
+        sample_number : int
+        out : array, optional
+            A float64 or float32 array of the library's shape to fill
+        dtype : optional
+            np.float64 (default) or np.float32, if out is not given
+        """
+        ideal_pattern = self.ideal_pattern(sample_number)
+        noise_level = self.noise_level(sample_number)
+        if out is None:
+            out = np.empty(ideal_pattern.shape, dtype=dtype)
+        self.rng.random(out=out, dtype=out.dtype)
+        out *= noise_level
+        out += ideal_pattern
+        return out, noise_level
+
+    def save(self, path):
+        "Generate every sample and save the library to an .npz file."
+        self.generate()
+        indices = range(self.num_samples)
+        np.savez(
+            path,
+            seed=np.array(str(self.seed)),
+            x=self.x,
+            peak_chance=self.peak_chance,
+            good_seeds=np.array(self.good_seeds),
+            intensities=np.array([self._intensities[i] for i in indices]),
+            ideal_patterns=np.array([self._ideal_patterns[i] for i in indices]),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a library written by :meth:`save`.
+
+        The noise Generator starts afresh, exactly as in a new library with
+        the same seed.
+        """
+        with np.load(path) as data:
+            patterns = data["ideal_patterns"]
+            library = cls(
+                len(patterns),
+                int(data["seed"]),
+                x=data["x"],
+                shape=patterns.shape[1:],
+                peak_chance=float(data["peak_chance"]),
+            )
+            library.good_seeds = data["good_seeds"].tolist()
+            intensities = data["intensities"]
+        for i, (intensity, pattern) in enumerate(zip(intensities, patterns)):
+            library._intensities[i] = intensity
+            library._ideal_patterns[i] = pattern
+        return library
+
+
+# At global scope, define 9 samples that we will base this demo/tutorial on.
+# They are generated on first use, not on import.
+
 num_samples = 9
 
-intensities = []
-ideal_patterns = []
-# Decide that 3-6 of these samples are "good".
-# The first one (0) is always good and the second one (1) is always bad.
-# Some random number of additional ones, up to a total of 6, are also good.
-good_seeds = [0] + np.random.choice(np.arange(2, 9), size=random.randint(2, 5), replace=False).tolist()
+_default_library = None
 
-for _ in range(num_samples):
-    iq = make_random_peaks(x, peak_chance=0.2) * 1000.0
-    image = generate_ideal_image(x, iq, SHAPE)
-    intensities.append(iq)
-    ideal_patterns.append(image)
 
+def default_library():
+    "The library used by generate_measured_image when none is given"
+    global _default_library
+    if _default_library is None:
+        _default_library = SampleLibrary(num_samples)
+    return _default_library
+
+
+def __getattr__(name):
+    # Lazily provide the module globals that used to be built on import.
+    if name == "good_seeds":
+        return default_library().good_seeds
+    if name == "intensities":
+        library = default_library()
+        return [library.intensity(i) for i in range(len(library))]
+    if name == "ideal_patterns":
+        library = default_library()
+        return [library.ideal_pattern(i) for i in range(len(library))]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def generate_measured_image(sample_number):
-    ideal_pattern = ideal_patterns[sample_number]
-    if sample_number in good_seeds:
-        noise_level = 100  # low noise
-    else:
-        noise_level = 800  # high noise
 
-    return (
-        ideal_pattern + generate_noise_image(ideal_pattern.shape, noise_level),
-        noise_level,
-    )
+def generate_measured_image(sample_number, library=None, out=None, dtype=np.float64):
+    """
+    Return a noisy image of a sample, and its noise level.
+
+    See :meth:`SampleLibrary.measure` for out and dtype.
+    """
+    if library is None:
+        library = default_library()
+    return library.measure(sample_number, out=out, dtype=dtype)
@@ -26,14 +26,21 @@ class DiffractionDetector(Device):
     signal_to_noise = Component(Signal, value=0)
 
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, library=None, dtype=numpy.float64, **kwargs):
         super().__init__(*args, **kwargs)
         self.delay = 2  # simulated exposure time delay
+        # a SampleLibrary, or None for the shared default one
+        self.library = library
+        self.dtype = dtype  # float64 or float32 images
 
     def trigger(self):
         "Generate a simulated reading with noise for the current sample."
         sample_number = sample_selector.get()
-        arr, snr = generate_measured_image(sample_number)
+        # A fresh frame each time, because readings already emitted hold
+        # references to earlier ones.
+        arr, snr = generate_measured_image(
+            sample_number, library=self.library, dtype=self.dtype
+        )
         # Update the internal signal with a simulated image.
         self.image.set(arr)
         self.signal_to_noise.set(snr)
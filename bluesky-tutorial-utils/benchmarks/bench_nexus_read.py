@@ -0,0 +1,70 @@
+"""
+Compare lazy read throughput of an energy series from NeXus (HDF5) and Zarr.
+
+The same images are written with writeImageEnergySeries and
+write_energy_series_zarr, each with its default compression, then read back
+in full with read_energyseries(lazy=True) and read_energyseries_zarr(lazy=True)
+on dask's threaded scheduler, with increasing numbers of workers.
+
+    python benchmarks/bench_nexus_read.py --energies 100 --shape 512 512
+"""
+import argparse
+import os
+import pathlib
+import tempfile
+import time
+
+import dask
+import numpy as np
+import xarray as xr
+
+from bluesky_tutorial_utils import nexus
+
+
+def _images(num, shape, seed=0):
+    rng = np.random.default_rng(seed)
+    qx = np.linspace(-0.1, 0.1, shape[0])
+    qy = np.linspace(-0.1, 0.1, shape[1])
+    q = np.hypot(*np.meshgrid(qx, qy, indexing="ij"))
+    for i in range(num):
+        image = (1 + i / num) / (1e-4 + q ** 4) * (1 + 0.05 * rng.random(shape))
+        yield xr.DataArray(image, dims=["Qx", "Qy"], coords={"Qx": qx, "Qy": qy})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--energies", type=int, default=50)
+    parser.add_argument("--shape", type=int, nargs=2, default=(512, 512))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    energies = np.linspace(270, 290, args.energies)
+    raw_mib = args.energies * np.prod(args.shape) * 8 / 2 ** 20
+    print(f"{args.energies} x {tuple(args.shape)} float64 images, {raw_mib:.0f} MiB")
+    workers = sorted({1, 2, 4, os.cpu_count() or 1})
+    with tempfile.TemporaryDirectory() as directory:
+        nxs = pathlib.Path(directory, "series.nxs")
+        store = pathlib.Path(directory, "series.zarr")
+        nexus.writeImageEnergySeries(nxs, _images(args.energies, args.shape), energies)
+        nexus.write_energy_series_zarr(
+            store, _images(args.energies, args.shape), energies
+        )
+        for label, read, path in [
+            ("NeXus/HDF5", nexus.read_energyseries, nxs),
+            ("Zarr", nexus.read_energyseries_zarr, store),
+        ]:
+            for num_workers in workers:
+                timings = []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    da = read(path, lazy=True)
+                    with dask.config.set(scheduler="threads", num_workers=num_workers):
+                        da.data.sum().compute()
+                    timings.append(time.perf_counter() - t0)
+                    da.close()
+                rate = raw_mib / min(timings)
+                print(f"{label:12} {num_workers:3} threads  {rate:8.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
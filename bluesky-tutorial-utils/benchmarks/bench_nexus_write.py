@@ -0,0 +1,66 @@
+"""
+Compare write throughput and file size of writeImageEnergySeries settings.
+
+The images are smooth, noisy scattering-like patterns, which compress
+roughly like CyRSoXS output. The first row reproduces the old defaults
+(gzip level 9, no shuffle, chunks chosen by h5py).
+
+    python benchmarks/bench_nexus_write.py --energies 100 --shape 512 512
+"""
+import argparse
+import pathlib
+import tempfile
+import time
+
+import numpy as np
+import xarray as xr
+
+from bluesky_tutorial_utils import nexus
+
+
+SETTINGS = [
+    ("gzip 9 (old default)", dict(compression_opts=9, shuffle=False, chunks=True)),
+    ("gzip 4 + shuffle (default)", dict()),
+    ("gzip 1 + shuffle", dict(compression_opts=1)),
+    ("lzf + shuffle", dict(compression="lzf")),
+    ("lzf", dict(compression="lzf", shuffle=False)),
+    ("uncompressed", dict(compression=None, shuffle=False)),
+]
+
+
+def _images(num, shape, seed=0):
+    rng = np.random.default_rng(seed)
+    qx = np.linspace(-0.1, 0.1, shape[0])
+    qy = np.linspace(-0.1, 0.1, shape[1])
+    q = np.hypot(*np.meshgrid(qx, qy, indexing="ij"))
+    for i in range(num):
+        image = (1 + i / num) / (1e-4 + q ** 4) * (1 + 0.05 * rng.random(shape))
+        yield xr.DataArray(image, dims=["Qx", "Qy"], coords={"Qx": qx, "Qy": qy})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--energies", type=int, default=50)
+    parser.add_argument("--shape", type=int, nargs=2, default=(256, 256))
+    args = parser.parse_args()
+
+    energies = np.linspace(270, 290, args.energies)
+    raw_mib = args.energies * np.prod(args.shape) * 8 / 2 ** 20
+    print(f"{args.energies} x {tuple(args.shape)} float64 images, {raw_mib:.0f} MiB")
+    with tempfile.TemporaryDirectory() as directory:
+        for i, (label, kwargs) in enumerate(SETTINGS):
+            fpath = pathlib.Path(directory, f"{i}.nxs")
+            nexus.initNexus(fpath)
+            images = _images(args.energies, args.shape)
+            t0 = time.perf_counter()
+            nexus.writeImageEnergySeries(fpath, images, energies, **kwargs)
+            elapsed = time.perf_counter() - t0
+            size_mib = fpath.stat().st_size / 2 ** 20
+            print(
+                f"{label:28} {raw_mib / elapsed:8.1f} MiB/s   "
+                f"file {size_mib:8.1f} MiB (ratio {raw_mib / size_mib:5.2f})"
+            )
+
+
+if __name__ == "__main__":
+    main()
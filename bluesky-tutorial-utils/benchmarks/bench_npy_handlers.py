@@ -0,0 +1,84 @@
+"""
+Compare peak RSS and latency of single-frame access through NpyFrameWise.
+
+Each configuration runs in a fresh subprocess so that peak RSS is measured
+independently. Peak RSS is read from /proc, so this runs on Linux only.
+
+    python benchmarks/bench_npy_handlers.py --frames 2000 --shape 512 512
+"""
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def _peak_rss_mib():
+    # VmHWM is the peak resident set size, in kB.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+
+def _child(fpath, mmap_mode, frame_no):
+    from bluesky_tutorial_utils._old_handlers import NpyFrameWise
+
+    if mmap_mode == "none":
+        mmap_mode = None
+    # Reset the peak RSS so that importing the package does not count.
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    rss_before = _peak_rss_mib()
+    t0 = time.perf_counter()
+    handler = NpyFrameWise(fpath, mmap_mode=mmap_mode)
+    frame = handler(frame_no)
+    # Touch every element so that lazy pages are actually read.
+    float(frame.sum())
+    latency = time.perf_counter() - t0
+    peak_rss = _peak_rss_mib() - rss_before
+    print(json.dumps({"latency_ms": latency * 1e3, "peak_rss_mib": peak_rss}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--shape", type=int, nargs=2, default=(512, 512))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        fpath = str(pathlib.Path(directory, "stack.npy"))
+        stack = np.lib.format.open_memmap(
+            fpath, mode="w+", dtype="<f4", shape=(args.frames, *args.shape)
+        )
+        stack[:] = 1
+        stack.flush()
+        del stack
+        size_mib = args.frames * np.prod(args.shape) * 4 / 2 ** 20
+        print(f"stack: {args.frames} x {tuple(args.shape)} float32, {size_mib:.0f} MiB")
+
+        for label, mmap_mode in [("eager load (old default)", "none"),
+                                 ("mmap_mode='r' (new default)", "r")]:
+            results = []
+            for _ in range(args.repeat):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", fpath, mmap_mode,
+                     str(args.frames // 2)],
+                    check=True, capture_output=True, text=True,
+                )
+                results.append(json.loads(out.stdout))
+            latency = min(r["latency_ms"] for r in results)
+            rss = min(r["peak_rss_mib"] for r in results)
+            print(f"{label:30} latency {latency:9.2f} ms   peak RSS +{rss:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main()
@@ -0,0 +1,51 @@
+"""
+Measure cold-start time of an IPython startup profile, eager vs. lazy.
+
+The profile is executed headless in a fresh interpreter with a non-interactive
+IPython shell, once with the default eager imports and once with
+BLUESKY_TUTORIAL_LAZY_IMPORTS=1, and the slowest imports of each are listed.
+
+    python benchmarks/bench_startup.py ../gm_user/user_profile.py
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from bluesky_tutorial_utils import import_time_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("profile", help="path to a startup script")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    profile = os.path.abspath(args.profile)
+    code = (
+        "from IPython.testing.globalipapp import start_ipython; "
+        "ip = start_ipython(); "
+        f"ip.safe_execfile({profile!r}, ip.user_ns, raise_exceptions=True)"
+    )
+
+    for label, lazy in [("eager", "0"), ("lazy", "1")]:
+        env = dict(os.environ, BLUESKY_TUTORIAL_LAZY_IMPORTS=lazy, MPLBACKEND="Agg")
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-c", code],
+                env=env,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            timings.append(time.perf_counter() - t0)
+        print(f"{label}: best of {args.repeat} cold starts {min(timings):.2f} s")
+        for module, cumulative_ms, _ in import_time_report(code, args.top, env):
+            print(f"    {cumulative_ms:9.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
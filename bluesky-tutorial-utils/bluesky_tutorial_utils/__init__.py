@@ -1,7 +1,33 @@
+import importlib
+
 from ._databroker import setup_data_saving, setup_data_saving_future_version  # noqa F401
-from . import fetch  # noqa F401
-from ._example_data import (
-    generate_example_data,
-    save_example_data,
-    get_example_catalog
-)
+from ._cache import FrameCache  # noqa F401
+from ._lazy import LazyObject, import_time_report, lazy_startup_enabled  # noqa F401
+
+# These import bluesky, ophyd, event_model or requests, which together take
+# about a second, so they are imported on first access. The startup profiles
+# import the helpers above from here and must not pay for them.
+_deferred = {
+    "fetch": "fetch",
+    "BatchFiller": "_filler",
+    "generate_benchmark_data": "_example_data",
+    "generate_example_data": "_example_data",
+    "save_example_data": "_example_data",
+    "get_example_catalog": "_example_data",
+    "write_example_index": "_example_data",
+}
+
+
+def __getattr__(name):
+    try:
+        module_name = _deferred[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    module = importlib.import_module(f"{__name__}.{module_name}")
+    value = module if name == module_name else getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *_deferred})
@@ -0,0 +1,161 @@
+"""A bounded cache for handler outputs."""
+import collections
+import threading
+
+import numpy as np
+
+
+class FrameCache:
+    """
+    Least-recently-used cache of arrays, bounded by total size in bytes.
+
+    One instance can be shared by many handler instances, so that re-reading
+    the same run does not recompute or reload its frames. Cached arrays are
+    marked read-only because every hit returns the same object.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Evict least-recently-used entries once the cached arrays exceed this
+        many bytes in total. Default is 256 MiB.
+
+    Examples
+    --------
+    Register a handler that shares one cache across all its instances.
+
+    >>> cache = FrameCache(max_bytes=2**30)
+    >>> handler_registry = {
+    ...     "newton": functools.partial(NewtonHandler, cache=cache),
+    ... }
+    """
+
+    def __init__(self, max_bytes=2 ** 28):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._nbytes = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        "Total size of the cached arrays, in bytes"
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, compute):
+        """
+        Return the cached value for key, calling compute() on a miss.
+
+        Parameters
+        ----------
+        key : hashable
+            Typically built with :func:`make_key`.
+
+        compute : callable
+            Called with no arguments to produce the array on a miss.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return value
+        # Compute outside the lock so slow loads do not serialize readers.
+        return self.put(key, compute())
+
+    def get_many(self, keys, compute_many):
+        """
+        Return a list of cached values for keys, computing misses in one call.
+
+        Parameters
+        ----------
+        keys : sequence of hashable
+
+        compute_many : callable
+            Called once with the list of positions in keys that missed. It
+            must return one value per position, in the same order.
+        """
+        values = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                try:
+                    values[i] = self._data[key]
+                except KeyError:
+                    missing.append(i)
+                else:
+                    self._data.move_to_end(key)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            for i, value in zip(missing, compute_many(missing)):
+                values[i] = self.put(keys[i], value)
+        return values
+
+    def put(self, key, value):
+        """
+        Insert value, evicting least-recently-used entries as needed.
+
+        An array that is a view (e.g. one frame of a batch, or of a memory
+        map) is copied first, so that the cache does not keep the whole base
+        array alive while counting only the view. Returns the value as
+        stored.
+        """
+        nbytes = getattr(value, "nbytes", 0)
+        if nbytes > self.max_bytes:
+            # Too big to ever fit; do not flush everything else for it.
+            return value
+        if isinstance(value, np.ndarray) and value.base is not None:
+            value = np.array(value, copy=True)
+        try:
+            value.flags.writeable = False
+        except AttributeError:
+            pass
+        with self._lock:
+            if key in self._data:
+                self._nbytes -= getattr(self._data.pop(key), "nbytes", 0)
+            self._data[key] = value
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._nbytes -= getattr(evicted, "nbytes", 0)
+        return value
+
+    def clear(self):
+        "Drop all entries and reset the hit/miss counters."
+        with self._lock:
+            self._data.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} {len(self)} items, "
+            f"{self._nbytes}/{self.max_bytes} bytes, "
+            f"hits={self.hits} misses={self.misses}>"
+        )
+
+
+def make_key(spec, resource_kwargs, datum_kwargs):
+    """
+    Build a hashable cache key from a spec and Resource/Datum kwargs.
+    """
+    return (spec, _freeze(resource_kwargs), _freeze(datum_kwargs))
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(v) for v in obj)
+    return obj
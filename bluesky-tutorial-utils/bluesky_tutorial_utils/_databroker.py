@@ -1,37 +1,240 @@
-def setup_data_saving(RE):
+import atexit
+import os
+import queue
+import threading
+import time
+
+
+def setup_data_saving(RE, *, buffered=False, max_events=1000, max_delay=1.0):
     """
     Subscribe a suitcase Serializer to RE and return a corresponding Catalog.
 
     The format happens to be msgpack, but that should be treated as an
     implementation detail subject to change.
+
+    Each run saved through RE is added to the Catalog when it completes,
+    without rescanning the data directory. Call ``catalog.force_reload()`` to
+    pick up files written by other processes.
+
+    Parameters
+    ----------
+    RE : RunEngine
+    buffered : bool, optional
+        If True, hand documents to a background thread, which packs
+        consecutive Events into EventPages and writes them out. The RunEngine
+        only waits for writing to finish at the end of each run, so the run
+        is complete in the Catalog as soon as RE returns. False by default.
+    max_events : int, optional
+        When buffered, the most Events packed into one EventPage.
+    max_delay : float, optional
+        When buffered, the longest time in seconds an Event is held before
+        it is written.
     """
     import appdirs
+    from databroker._drivers.msgpack import gen
     from event_model import RunRouter
     import intake
     from suitcase.msgpack import Serializer
     from pathlib import Path
 
+    from ._filler import BatchFiller, paged_documents
+
     directory = appdirs.user_data_dir("bluesky", "tutorial_utils")
     driver = intake.registry["bluesky-msgpack-catalog"]
-    catalog = driver(str(Path(directory, "*.msgpack")))
+
+    class IncrementalCatalog(driver):
+        """
+        Serve entries from an in-memory index of (start, stop, filename).
+
+        The directory is scanned only on construction and on explicit
+        force_reload(). Completed runs are registered one at a time, and
+        search() results are built from the index, not from the files.
+        """
+
+        def __init__(self, paths, *, index=None, **kwargs):
+            # The base class loads during __init__, so set these first.
+            self._index = {} if index is None else index
+            self._load_from_index = index is not None
+            # Never rescan just because time has passed.
+            kwargs.setdefault("ttl", float("inf"))
+            super().__init__(paths, **kwargs)
+
+        def _load(self):
+            if self._load_from_index:
+                self._load_from_index = False
+                for start_doc, stop_doc, filename in list(self._index.values()):
+                    self._add(start_doc, stop_doc, filename)
+            else:
+                super()._load()
+
+        def _add(self, start_doc, stop_doc, filename):
+            self.upsert(start_doc, stop_doc, gen, (filename,), {})
+
+        def upsert(self, start_doc, stop_doc, gen_func, gen_args, gen_kwargs):
+            (filename,) = gen_args
+            self._index[start_doc["uid"]] = (start_doc, stop_doc, filename)
+            # Pack Events into EventPages so BatchFiller can fill them at once.
+            super().upsert(
+                start_doc, stop_doc, paged_documents, (gen_func, *gen_args), gen_kwargs
+            )
+
+        def register_run(self, start_doc, stop_doc, filename):
+            "Add one completed run without rescanning the directory."
+            self._filename_to_mtime[filename] = os.path.getmtime(filename)
+            self._add(start_doc, stop_doc, filename)
+
+        def search(self, query):
+            query = dict(query)
+            if self._query:
+                query = {"$and": [self._query, query]}
+            return type(self)(
+                paths=self.paths,
+                index=self._index,
+                query=query,
+                handler_registry=self._handler_registry,
+                filler_class=self._filler_class,
+                transforms=self._transforms,
+                root_map=self._root_map,
+                name="search results",
+                getenv=self.getenv,
+                getshell=self.getshell,
+                auth=self.auth,
+                metadata=(self.metadata or {}).copy(),
+                storage_options=self.storage_options,
+            )
+
+    catalog = IncrementalCatalog(
+        str(Path(directory, "*.msgpack")), filler_class=BatchFiller
+    )
 
     class PatchedSerializer(Serializer):
         """
         Work around https://github.com/bluesky/databroker/pull/559
         """
 
+        def start(self, doc):
+            self._start_doc = doc
+            super().start(doc)
+
         def stop(self, doc):
             super().stop(doc)
-            catalog.force_reload()
+            (filename,) = self.artifacts["all"]
+            catalog.register_run(self._start_doc, doc, str(filename))
 
     def factory(name, start):
         return [PatchedSerializer(directory)], []
 
     rr = RunRouter([factory])
-    RE.subscribe(rr)
+    if buffered:
+        RE.subscribe(_BufferedDocumentWriter(rr, max_events, max_delay))
+    else:
+        RE.subscribe(rr)
     return catalog
 
 
+# Queued by _BufferedDocumentWriter._flush_at_exit in place of a document name.
+_FLUSH = object()
+
+
+class _BufferedDocumentWriter:
+    """
+    Forward documents to callback on a background thread, batching Events.
+
+    Consecutive Events from the same descriptor are packed into one
+    EventPage, which is emitted when it holds max_events Events, when its
+    oldest Event is max_delay seconds old, or when any other document
+    arrives. Calls return immediately, except for 'stop', which blocks until
+    everything up to and including it has been handled. Anything still
+    queued or buffered is written out before the interpreter exits.
+    """
+
+    def __init__(self, callback, max_events=1000, max_delay=1.0):
+        self._callback = callback
+        self._max_events = max_events
+        self._max_delay = max_delay
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+        atexit.register(self._flush_at_exit)
+
+    def __call__(self, name, doc):
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+        self._queue.put((name, doc))
+        if name == "stop":
+            self._queue.join()
+            if self._error is not None:
+                err, self._error = self._error, None
+                raise err
+
+    def _flush_at_exit(self):
+        "Write out everything queued or buffered, and wait until it is done."
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait()
+
+    def _worker(self):
+        events = []
+        deadline = None
+
+        def flush():
+            nonlocal deadline
+            if events:
+                self._emit_events(events)
+                events.clear()
+            deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                name, doc = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                flush()
+                continue
+            try:
+                if name is _FLUSH:
+                    flush()
+                    doc.set()
+                elif name == "event":
+                    if events and events[-1]["descriptor"] != doc["descriptor"]:
+                        flush()
+                    if not events:
+                        deadline = time.monotonic() + self._max_delay
+                    events.append(doc)
+                    if len(events) >= self._max_events:
+                        flush()
+                else:
+                    flush()
+                    self._emit(name, doc)
+            except Exception as err:
+                # Keep the worker alive, or a later 'stop' would wait forever.
+                self._error = err
+            finally:
+                # Events held in the buffer count as handled: a 'stop'
+                # always flushes them before join() can return, and at exit
+                # _flush_at_exit flushes them.
+                self._queue.task_done()
+
+    def _emit(self, name, doc):
+        try:
+            self._callback(name, doc)
+        except Exception as err:
+            self._error = err
+
+    def _emit_events(self, events):
+        from event_model import pack_event_page
+
+        try:
+            self._callback("event_page", pack_event_page(*events))
+        except Exception as err:
+            self._error = err
+
+
+
 def setup_data_saving_future_version(RE):
     from tiled.client import from_catalog
     from suitcase.mongo_normalized import Serializer
@@ -1,4 +1,8 @@
+import concurrent.futures
+import json
+import os
 from pathlib import Path
+import uuid
 
 import numpy as np
 
@@ -6,20 +10,39 @@ from bluesky import RunEngine
 from bluesky.plans import count
 from bluesky.preprocessors import SupplementalData
 import bluesky.plans as bp
-from databroker.utils import normalize_human_friendly_time
 import event_model
 import tzlocal
 
+from ._filler import BatchFiller, paged_documents
 from ._newton import NewtonSimulator
 
 here = Path(__file__).parent
 
 
 class RewriteTimes(event_model.SingleRunDocumentRouter):
-    def __init__(self, t0, callback):
+    """
+    Shift all the times in one run so that it starts at t0.
+
+    Parameters
+    ----------
+    t0 : str or float
+        A human-friendly time, e.g. "2020-01-01 9:00", or a timestamp
+    callback : callable
+        Receives the modified (name, doc) pairs
+    inplace : bool, optional
+        If True, modify the documents passed in rather than copies of them.
+        Use this only if the caller owns the documents and does not need the
+        originals. False by default.
+    """
+
+    def __init__(self, t0, callback, *, inplace=False):
+        # Imported here because importing databroker is slow.
+        from databroker.utils import normalize_human_friendly_time
+
         self._callback = callback
-        self._t0 = normalize_human_friendly_time(t0, tzlocal.get_localzone().zone)
+        self._t0 = normalize_human_friendly_time(t0, str(tzlocal.get_localzone()))
         self._delta = None
+        self._inplace = inplace
         super().__init__()
 
     def __call__(self, name, doc):
@@ -28,12 +51,27 @@ class RewriteTimes(event_model.SingleRunDocumentRouter):
         self._callback(name, doc)
 
     def _patch_time(self, doc):
-        doc = doc.copy()
+        if not self._inplace:
+            doc = doc.copy()
         doc["time"] -= self._delta
         return doc
 
     def _patch_time_stamps(self, ts_dict):
-        return {k: v - self._delta for k, v in ts_dict.items()}
+        if not self._inplace:
+            return {k: v - self._delta for k, v in ts_dict.items()}
+        for k in ts_dict:
+            ts_dict[k] -= self._delta
+        return ts_dict
+
+    def _patch_column(self, column):
+        # Shift a whole column of an EventPage in one vectorized operation.
+        # Float arrays are shifted in place when allowed; anything else
+        # (e.g. a list from JSON) is converted to a new array.
+        inplace = self._inplace and isinstance(column, np.ndarray)
+        if inplace and column.dtype.kind == "f":
+            column -= self._delta
+            return column
+        return np.subtract(column, self._delta, dtype=float)
 
     def start(self, doc):
         self._delta = doc["time"] - self._t0
@@ -51,7 +89,14 @@ class RewriteTimes(event_model.SingleRunDocumentRouter):
         return doc
 
     def event_page(self, doc):
-        return self._patch_time(doc)
+        if not self._inplace:
+            doc = doc.copy()
+            doc["timestamps"] = doc["timestamps"].copy()
+        doc["time"] = self._patch_column(doc["time"])
+        timestamps = doc["timestamps"]
+        for key in timestamps:
+            timestamps[key] = self._patch_column(timestamps[key])
+        return doc
 
 
 def generate_example_data(callback):
@@ -105,7 +150,178 @@ def _generate_newton_data(RE, callback, time_vector, **kwargs):
         RE(bp.scan([ns], ns.gap, 0, 4, 25), RewriteTimes(ts, callback), **kwargs)
 
 
+def generate_benchmark_data(
+    destination,
+    num_runs,
+    *,
+    events_per_run=25,
+    image_shape=(128, 128),
+    format="jsonl",
+    seed=0,
+    t0="2020-01-01 9:00",
+    run_interval=60.0,
+    processes=None,
+):
+    """
+    Generate a large, reproducible catalog for benchmarking.
+
+    Each run is a scan of a NewtonSimulator's gap with a scalar detector,
+    like the Newton runs in the example data. Documents are composed
+    directly rather than through a RunEngine, so there are no wall-clock
+    sleeps, and runs are split across a pool of processes. Every uid, time
+    and reading is derived from (seed, run number), so the output is the
+    same for a given seed no matter how many processes are used.
+
+    Parameters
+    ----------
+    destination : str
+        A directory for "jsonl" and "msgpack", or a MongoDB URI for "mongo"
+    num_runs : int
+    events_per_run : int, optional
+    image_shape : tuple, optional
+        Shape of the (externally referenced) Newton image in each event
+    format : {"jsonl", "msgpack", "mongo"}, optional
+    seed : int, optional
+    t0 : str or float, optional
+        Start time of the first run; later runs follow every run_interval
+        seconds.
+    run_interval : float, optional
+    processes : int, optional
+        Number of worker processes. Default is the number of CPUs.
+    """
+    from databroker.utils import normalize_human_friendly_time
+
+    if format not in ("jsonl", "msgpack", "mongo"):
+        raise ValueError(f"Unsupported format {format!r}")
+    t0 = normalize_human_friendly_time(t0, str(tzlocal.get_localzone()))
+    params = dict(
+        destination=str(destination),
+        events_per_run=events_per_run,
+        image_shape=tuple(image_shape),
+        format=format,
+        seed=seed,
+        t0=t0,
+        run_interval=run_interval,
+    )
+    if format != "mongo":
+        Path(destination).mkdir(parents=True, exist_ok=True)
+    workers = max(min(processes or os.cpu_count(), num_runs), 1)
+    chunks = [range(i, num_runs, workers) for i in range(workers)]
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        list(executor.map(_write_benchmark_runs, chunks, [params] * workers))
+
+
+def _write_benchmark_runs(run_numbers, params):
+    "Write some of the benchmark runs; this runs in a worker process."
+    if params["format"] == "mongo":
+        from suitcase.mongo_normalized import Serializer
+
+        serializer = Serializer(params["destination"], params["destination"])
+
+        def factory():
+            return serializer
+
+    else:
+        if params["format"] == "jsonl":
+            from suitcase.jsonl import Serializer
+        else:
+            from suitcase.msgpack import Serializer
+
+        def factory():
+            return Serializer(params["destination"])
+
+    ns = NewtonSimulator(
+        50, 2 * np.pi / 0.4, shape=params["image_shape"], name="ns"
+    )
+    for i in run_numbers:
+        callback = RewriteTimes(
+            params["t0"] + i * params["run_interval"], factory(), inplace=True
+        )
+        for name, doc in _compose_benchmark_run(
+            ns, np.random.default_rng([params["seed"], i]), params["events_per_run"]
+        ):
+            callback(name, doc)
+
+
+def _compose_benchmark_run(ns, rng, num_events):
+    """
+    Yield the documents of one run, with times starting from zero.
+    """
+
+    def new_uid():
+        return str(uuid.UUID(bytes=rng.bytes(16), version=4))
+
+    gaps = np.linspace(0, 4, num_events)
+    run = event_model.compose_run(
+        uid=new_uid(),
+        time=0.0,
+        metadata={
+            "plan_name": "scan",
+            "detectors": ["det", "ns"],
+            "motors": ["ns_gap"],
+            "num_points": num_events,
+            "operator": str(rng.choice(["Dmitri", "Michael"])),
+            "hints": {"dimensions": [[["ns_gap"], "primary"]]},
+        },
+        # Schema validation would dominate the cost of generating documents.
+        validate=False,
+    )
+    yield "start", run.start_doc
+
+    resource, compose_datum, _ = run.compose_resource(
+        spec="newton",
+        root="/",
+        resource_path="",
+        resource_kwargs={
+            "radius": ns._R,
+            "wave_number": ns._k,
+            "shape": list(ns._shape),
+            "dtype": ns._dtype.str,
+        },
+        uid=new_uid(),
+        validate=False,
+    )
+    yield "resource", resource
+
+    data_keys = dict(ns.describe())
+    data_keys["det"] = {"source": "SIM:det", "dtype": "number", "shape": []}
+    no_configuration = {"data": {}, "timestamps": {}, "data_keys": {}}
+    descriptor, compose_event, _ = run.compose_descriptor(
+        data_keys=data_keys,
+        name="primary",
+        object_keys={"ns": list(ns.describe()), "det": ["det"]},
+        configuration={"ns": no_configuration, "det": no_configuration},
+        uid=new_uid(),
+        time=0.0,
+        validate=False,
+    )
+    yield "descriptor", descriptor
+
+    readings = rng.normal(size=num_events)
+    for seq_num, (gap, reading) in enumerate(zip(gaps, readings), start=1):
+        datum = compose_datum(datum_kwargs={"gap": float(gap)}, validate=False)
+        yield "datum", datum
+        t = seq_num * 0.1
+        yield "event", compose_event(
+            data={
+                "ns_gap": float(gap),
+                "ns_image": datum["datum_id"],
+                "det": float(reading),
+            },
+            timestamps={"ns_gap": t, "ns_image": t, "det": t},
+            seq_num=seq_num,
+            filled={"ns_image": False},
+            uid=new_uid(),
+            time=t,
+            validate=False,
+        )
+    yield "stop", run.compose_stop(
+        uid=new_uid(), time=(num_events + 1) * 0.1, validate=False
+    )
+
+
 directory = here / "example_data"
+index_path = directory / "index.json"
 
 
 def save_example_data():
@@ -121,11 +337,79 @@ def save_example_data():
 
     rr = event_model.RunRouter([factory])
     generate_example_data(rr)
+    write_example_index()
+
+
+def write_example_index():
+    """
+    Write a summary of every example run to example_data/index.json.
+
+    The index holds each run's start and stop documents, its file name and
+    file size, so that get_example_catalog() can list and search runs
+    without opening the JSONL files.
+    """
+    runs = []
+    for path in sorted(directory.glob("*.jsonl")):
+        with open(path, "rb") as file:
+            name, start_doc = json.loads(file.readline())
+            # The stop document is always the last line.
+            file.seek(0, 2)
+            file.seek(max(file.tell() - 2 ** 16, 0))
+            name, stop_doc = json.loads(file.read().splitlines()[-1])
+        if name != "stop":
+            stop_doc = None
+        runs.append(
+            {
+                "filename": path.name,
+                "size": path.stat().st_size,
+                "start": start_doc,
+                "stop": stop_doc,
+            }
+        )
+    with open(index_path, "w") as file:
+        json.dump({"version": 1, "runs": runs}, file, indent=1)
+
+
+def _read_example_index():
+    """
+    Return the runs in the index, or None if the index is missing or stale.
+    """
+    try:
+        with open(index_path) as file:
+            runs = json.load(file)["runs"]
+    except FileNotFoundError:
+        return None
+    sizes = {path.name: path.stat().st_size for path in directory.glob("*.jsonl")}
+    if sizes != {run["filename"]: run["size"] for run in runs}:
+        return None
+    return runs
 
 
 def get_example_catalog():
-    from databroker._drivers.jsonl import BlueskyJSONLCatalog
+    from databroker._drivers.jsonl import BlueskyJSONLCatalog, gen
+
+    class IndexedJSONLCatalog(BlueskyJSONLCatalog):
+        """
+        List and search runs using example_data/index.json.
+
+        A JSONL file is only opened when its run's data is accessed. If the
+        index is missing or out of date, fall back to reading every file.
+        """
+
+        def _load(self):
+            runs = _read_example_index()
+            if runs is None:
+                return super()._load()
+            for run in runs:
+                filename = str(directory / run["filename"])
+                self.upsert(run["start"], run["stop"], gen, (filename,), {})
+
+        def upsert(self, start_doc, stop_doc, gen_func, gen_args, gen_kwargs):
+            # Pack Events into EventPages so BatchFiller can fill them at once.
+            super().upsert(
+                start_doc, stop_doc, paged_documents, (gen_func, *gen_args), gen_kwargs
+            )
 
     # TODO Use pkg_resources here. This relies on this being an editable
     # installation.
-    return BlueskyJSONLCatalog(str(directory / "*.jsonl"))
+    return IndexedJSONLCatalog(str(directory / "*.jsonl"), filler_class=BatchFiller)
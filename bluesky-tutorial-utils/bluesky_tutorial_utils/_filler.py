@@ -0,0 +1,144 @@
+"""A Filler that reads whole EventPages through handlers' fill_many."""
+import copy
+
+import event_model
+
+
+class BatchFiller(event_model.Filler):
+    """
+    A Filler that fills an EventPage with one handler call per Resource.
+
+    For each external key in an EventPage, the Datums of the Events are
+    grouped by Resource and each group is read by the handler's
+    ``fill_many(datum_kwargs_list)``, as provided by NewtonHandler and
+    NpyFrameWise. If any handler lacks ``fill_many``, or a Datum or Resource
+    is not known yet, the page is filled Event by Event, as Filler does. So
+    is every page when ``coerce="delayed"``, which must produce one dask
+    array per Event.
+
+    Databroker hands a Filler EventPages only when documents are read with
+    ``run.documents(fill="yes")`` (or ``canonical``). ``run.primary.read()``
+    and ``to_dask()`` fill Event by Event with ``coerce="delayed"``, one
+    dask task per Datum, and gain nothing from this class. Runs stored as
+    single Events reach the Filler as pages only if the catalog packs them,
+    as the catalogs here do with ``paged_documents``.
+
+    The parameters are those of event_model.Filler.
+    """
+
+    def fill_event_page(self, doc, include=None, exclude=None, inplace=None):
+        if self._coerce == "delayed":
+            return super().fill_event_page(doc, include, exclude, inplace)
+        descriptor = self._descriptor_cache[doc["descriptor"]]
+        try:
+            filled = doc["filled"]
+        except KeyError:
+            # Infer that none of the external data is filled, as Filler does.
+            filled = {
+                key: [False] * len(doc["seq_num"])
+                for key, val in descriptor["data_keys"].items()
+                if "external" in val
+            }
+        batches = {}
+        for key, column in filled.items():
+            if exclude is not None and key in exclude:
+                continue
+            if include is not None and key not in include:
+                continue
+            rows = [i for i, val in enumerate(column) if val is False]
+            if not rows:
+                continue
+            try:
+                datum_ids = [doc["data"][key][i] for i in rows]
+            except KeyError:
+                # Let Filler report the invalid documents.
+                return super().fill_event_page(doc, include, exclude, inplace)
+            groups = self._group_by_resource(datum_ids)
+            if groups is None:
+                return super().fill_event_page(doc, include, exclude, inplace)
+            batches[key] = rows, datum_ids, groups
+
+        if inplace is None:
+            inplace = self._inplace
+        if not inplace:
+            doc = copy.copy(doc)
+            doc["data"] = dict(doc["data"])
+        doc["filled"] = dict(filled)
+        self._current_state.descriptor = descriptor
+        try:
+            for key, (rows, datum_ids, groups) in batches.items():
+                data = list(doc["data"][key])
+                filled_column = list(filled[key])
+                self._current_state.key = key
+                for resource, handler, positions in groups:
+                    self._current_state.resource = resource
+                    datums = [self._datum_cache[datum_ids[j]] for j in positions]
+                    images = handler.fill_many(
+                        [datum["datum_kwargs"] for datum in datums]
+                    )
+                    for j, image in zip(positions, images):
+                        data[rows[j]] = image
+                        filled_column[rows[j]] = datum_ids[j]
+                doc["data"][key] = data
+                doc["filled"][key] = filled_column
+        finally:
+            self._current_state.key = None
+            self._current_state.descriptor = None
+            self._current_state.resource = None
+        return doc
+
+    def _group_by_resource(self, datum_ids):
+        """
+        Return [(resource, handler, positions), ...] for these datum_ids.
+
+        Returns None if a Datum or Resource is not in the cache or a
+        handler has no fill_many.
+        """
+        positions = {}
+        for j, datum_id in enumerate(datum_ids):
+            try:
+                resource_uid = self._datum_cache[datum_id]["resource"]
+            except KeyError:
+                return None
+            positions.setdefault(resource_uid, []).append(j)
+        groups = []
+        for resource_uid, group in positions.items():
+            try:
+                resource = self._resource_cache[resource_uid]
+            except KeyError:
+                return None
+            handler = self._get_handler_maybe_cached(resource)
+            if not hasattr(handler, "fill_many"):
+                return None
+            groups.append((resource, handler, group))
+        return groups
+
+
+def paged_documents(gen_func, *args, **kwargs):
+    """
+    Yield the documents from ``gen_func(*args, **kwargs)``, with each run of
+    consecutive Events (or EventPages, such as the one-Event pages that
+    suitcase writes) from the same descriptor packed into one EventPage.
+
+    Use this as a catalog's ``gen_func`` so that BatchFiller sees a whole
+    stream of Events at once. Resources and Datums, which are usually
+    interleaved with the Events, are passed on at once and do not end a page;
+    the EventPage follows every Datum it refers to.
+    """
+    events = []
+    for name, doc in gen_func(*args, **kwargs):
+        if name in ("event", "event_page"):
+            if events and events[-1]["descriptor"] != doc["descriptor"]:
+                yield "event_page", event_model.pack_event_page(*events)
+                events = []
+            if name == "event":
+                events.append(doc)
+            else:
+                events.extend(event_model.unpack_event_page(doc))
+            continue
+        if events and name not in ("resource", "datum", "datum_page"):
+            yield "event_page", event_model.pack_event_page(*events)
+            events = []
+        yield name, doc
+    if events:
+        yield "event_page", event_model.pack_event_page(*events)
@@ -0,0 +1,105 @@
+"""Deferred imports, for fast startup of interactive profiles."""
+import os
+import subprocess
+import sys
+
+
+def lazy_startup_enabled():
+    """
+    Return True if the BLUESKY_TUTORIAL_LAZY_IMPORTS environment variable is
+    set to anything but "" or "0".
+    """
+    return os.environ.get("BLUESKY_TUTORIAL_LAZY_IMPORTS", "") not in ("", "0")
+
+
+class LazyObject:
+    """
+    Stand-in for an object that is created on first use.
+
+    Calls and attribute access are forwarded to the real object. If a
+    namespace and name are given, the stand-in replaces itself there with
+    the real object once resolved, so later lookups pay nothing.
+
+    Parameters
+    ----------
+    factory : callable
+        Called with no arguments to create the real object.
+    namespace : dict, optional
+    name : str, optional
+    """
+
+    __slots__ = ("_factory", "_namespace", "_name", "_obj", "_resolved")
+
+    def __init__(self, factory, namespace=None, name=None):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_namespace", namespace)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_obj", None)
+        object.__setattr__(self, "_resolved", False)
+
+    def _resolve(self):
+        if not self._resolved:
+            object.__setattr__(self, "_obj", self._factory())
+            object.__setattr__(self, "_resolved", True)
+            namespace = self._namespace
+            if namespace is not None and namespace.get(self._name) is self:
+                namespace[self._name] = self._obj
+        return self._obj
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._resolve(), attr, value)
+
+    def __dir__(self):
+        return dir(self._resolve())
+
+    def __repr__(self):
+        if not self._resolved:
+            return f"<lazy {self._name or self._factory!r} (not yet created)>"
+        return repr(self._obj)
+
+
+def import_time_report(code, top=20, env=None):
+    """
+    Run code in a fresh interpreter and report where import time went.
+
+    This uses Python's ``-X importtime`` option.
+
+    Parameters
+    ----------
+    code : str
+        Python source to execute, e.g. ``"import bluesky"``
+    top : int, optional
+        Number of modules to report. Default is 20.
+    env : dict, optional
+        Environment for the subprocess
+
+    Returns
+    -------
+    report : list of (module, cumulative_ms, self_ms) tuples
+        Sorted by cumulative import time, slowest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    report = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        report.append(
+            (module.strip(), int(cumulative_us) / 1000, int(self_us) / 1000)
+        )
+    report.sort(key=lambda item: item[1], reverse=True)
+    return report[:top]
@@ -2,6 +2,8 @@ import os
 
 import numpy as np
 
+from ._cache import make_key
+
 
 class NpyHandler:
     """
@@ -12,37 +14,160 @@ class NpyHandler:
     fpath : str
         Path to file
 
-    mmap_mode : {'r', 'r+', c}, optional
-        memmap mode to use to open file
+    mmap_mode : {'r', 'r+', 'c', None}, optional
+        memmap mode to use to open file. The default, 'r', maps the file
+        read-only so that only the pages actually accessed are read from
+        disk. Pass None to load the whole file into memory on each call.
+
+    cache : FrameCache, optional
+        cache to share loaded arrays between handler instances. It is used
+        only with mmap_mode=None: a memory map is already cheap to read from,
+        and caching it would count the whole file against the cache's budget.
     """
 
     specs = {"npy"}
 
-    def __init__(self, filename, mmap_mode=None):
+    def __init__(self, filename, mmap_mode="r", cache=None):
         self._mmap_mode = mmap_mode
         if not os.path.exists(filename):
             raise IOError("the requested file {fpath} does not exist")
         self._fpath = filename
+        self._cache = cache
+        self._data = None
+
+    def _load(self):
+        if self._mmap_mode is None:
+            return np.load(self._fpath)
+        # A memory map is cheap to hold open, so open it once, on first use.
+        if self._data is None:
+            self._data = np.load(self._fpath, self._mmap_mode)
+        return self._data
 
     def __call__(self):
-        return np.load(self._fpath, self._mmap_mode)
+        if self._cache is None or self._mmap_mode is not None:
+            return self._load()
+        return self._cache.get(
+            make_key("npy", {"filename": self._fpath}, {}), self._load
+        )
 
     def get_file_list(self, datum_kwarg_gen):
         return [self._fpath]
 
 
 class NpyFrameWise:
+    """
+    Class to read individual frames out of a stack saved as one npy file
+
+    Parameters
+    ----------
+    fpath : str
+        Path to file
+
+    mmap_mode : {'r', 'r+', 'c', None}, optional
+        memmap mode to use to open file. The default, 'r', maps the file
+        read-only, so reading one frame touches only that frame's pages and
+        the returned frames are views, not copies. Pass None to load the
+        whole stack into memory on first access.
+
+    cache : FrameCache, optional
+        cache to share loaded frames between handler instances
+    """
+
     specs = {"npy_FRAMEWISE"}
 
-    def __init__(self, filename, mmap_mode=None):
+    def __init__(self, filename, mmap_mode="r", cache=None):
         self._mmap_mode = mmap_mode
         if not os.path.exists(filename):
             raise IOError("the requested file {fpath} does not exist")
         self._fpath = filename
-        self._data = np.load(self._fpath, self._mmap_mode)
+        self._cache = cache
+        self._data_ = None
+
+    @property
+    def _data(self):
+        # Open lazily: databroker may construct a handler per Resource
+        # without ever reading from it.
+        if self._data_ is None:
+            self._data_ = np.load(self._fpath, self._mmap_mode)
+        return self._data_
+
+    def _stack(self, stop):
+        # The file may still be growing (frames are appended while a run is
+        # in progress), so re-open it if frames up to stop were not there yet.
+        if self._data_ is not None and stop > len(self._data_):
+            self._data_ = None
+        return self._data
 
     def __call__(self, frame_no):
-        return self._data[frame_no]
+        if self._cache is None:
+            return self._stack(frame_no + 1)[frame_no]
+        return self._cache.get(
+            make_key(
+                "npy_FRAMEWISE", {"filename": self._fpath}, {"frame_no": frame_no}
+            ),
+            lambda: self._stack(frame_no + 1)[frame_no],
+        )
+
+    def fill_many(self, datum_kwargs_list):
+        """
+        Read the frames for many datums at once.
+
+        Runs of evenly-spaced frame numbers (e.g. a whole event stream) are
+        served as a single slice, which is a view on the memory-mapped stack.
+        Anything else is read with one fancy-indexing operation. BatchFiller
+        calls this once per EventPage, and the catalogs from
+        get_example_catalog and setup_data_saving pack each stream into one
+        EventPage, so ``run.documents(fill="yes")`` reads a stream in one
+        call. ``run.primary.read()`` still reads frame by frame.
+
+        Parameters
+        ----------
+        datum_kwargs_list : iterable of dict
+            The ``datum_kwargs`` of each Datum, e.g. ``[{"frame_no": 0}, ...]``
+
+        Returns
+        -------
+        frames : ndarray
+            Array of shape ``(N, *frame_shape)``
+        """
+        frame_nos = [datum_kwargs["frame_no"] for datum_kwargs in datum_kwargs_list]
+        if self._cache is None:
+            return self._read_frames(frame_nos)
+
+        keys = [
+            make_key("npy_FRAMEWISE", {"filename": self._fpath}, {"frame_no": n})
+            for n in frame_nos
+        ]
+        frames = self._cache.get_many(
+            keys, lambda missing: self._read_frames([frame_nos[i] for i in missing])
+        )
+        return np.stack(frames)
+
+    def _read_frames(self, frame_nos):
+        frame_nos = np.asarray(frame_nos, dtype=np.intp)
+        data = self._stack(int(frame_nos.max(initial=-1)) + 1)
+        s = _as_slice(frame_nos)
+        if s is not None:
+            return data[s]
+        return data[frame_nos]
 
     def get_file_list(self, datum_kwarg_gen):
         return [self._fpath]
+
+
+def _as_slice(indices):
+    """
+    Return a slice equivalent to a 1D array of indices, or None.
+
+    Only non-negative, evenly-spaced, increasing indices can be expressed as
+    a slice.
+    """
+    if len(indices) == 0 or indices[0] < 0:
+        return None
+    start = int(indices[0])
+    if len(indices) == 1:
+        return slice(start, start + 1)
+    step = int(indices[1] - indices[0])
+    if step <= 0 or np.any(np.diff(indices) != step):
+        return None
+    return slice(start, int(indices[-1]) + 1, step)
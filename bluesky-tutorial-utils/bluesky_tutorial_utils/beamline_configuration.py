@@ -4,15 +4,28 @@ import matplotlib
 get_ipython().run_line_magic("matplotlib", "widget")  # i.e. %matplotlib widget
 import matplotlib.pyplot
 
-from ophyd import Device, Component, EpicsSignal
+from ophyd import Device, Component, EpicsSignal, Signal
 from ophyd.signal import EpicsSignalBase
 from ophyd.areadetector.filestore_mixins import resource_factory
+# Imported under private names so they stay out of the namespace of
+# notebooks that star-import this module.
+import atexit as _atexit
+import concurrent.futures as _futures
+import queue as _queue
+import threading as _threading
+import time as _time
 import uuid
 import os
 from pathlib import Path
 import numpy as np
 from IPython import get_ipython
 
+from ._lazy import LazyObject as _LazyObject
+from ._lazy import lazy_startup_enabled as _lazy_startup_enabled
+
+# Set BLUESKY_TUTORIAL_LAZY_IMPORTS=1 to defer slow imports until first use.
+_LAZY_IMPORTS = _lazy_startup_enabled()
+
 # Set up a RunEngine and use metadata backed by a sqlite file.
 from bluesky import RunEngine
 from bluesky.utils import PersistentDict
@@ -27,12 +40,22 @@ sd = SupplementalData()
 RE.preprocessors.append(sd)
 
 # Set up a Broker.
-from databroker import Broker
+if _LAZY_IMPORTS:
+    # Importing databroker takes seconds; defer it until the first document.
+    def _make_broker():
+        from databroker import Broker
+
+        return Broker.named("temp")
+
+    db = _LazyObject(_make_broker, globals(), "db")
+    RE.subscribe(lambda name, doc: db.insert(name, doc))
+else:
+    from databroker import Broker
 
-db = Broker.named("temp")
+    db = Broker.named("temp")
 
-# and subscribe it to the RunEngine
-RE.subscribe(db.insert)
+    # and subscribe it to the RunEngine
+    RE.subscribe(db.insert)
 
 # Add a progress bar.
 from bluesky.utils.jupyter import pbar_manager_for_notebook
@@ -47,6 +70,9 @@ from bluesky.magics import BlueskyMagics
 get_ipython().register_magics(BlueskyMagics)
 
 # Set up plots with bluesky_widgets.
+# The plotting setup below stays eager even with lazy imports. Deferring it
+# to the first document would build figures on the RunEngine's thread, but
+# the widget backend must be set up, and figures created, on the main thread.
 from bluesky_widgets.models.auto_plot_builders import AutoLines
 from bluesky_widgets.utils.streaming import stream_documents_into_runs
 from bluesky_widgets.jupyter.figures import JupyterFigures
@@ -79,6 +105,9 @@ install_nb_kicker()
 # namespace
 import numpy as np
 
+# These are not deferred even with lazy imports: all but bluesky.simulators,
+# which is cheap, have been imported already, by bluesky itself,
+# BlueskyMagics and BestEffortCallback.
 import bluesky.callbacks
 from bluesky.callbacks import *
 
@@ -104,7 +133,141 @@ class Det(Device):
 # here there be 🐉🐉🐉🐉🐉🐉
 
 
+class _NpyStackWriter:
+    """
+    Append equally-shaped frames to a single .npy file.
+
+    A fixed-size header is reserved up front and rewritten after every
+    append, so the file is always a valid .npy stack of the frames written
+    so far and can be read by NpyFrameWise. The file is grown in chunks of
+    ``chunk_frames`` frames and trimmed on close.
+    """
+
+    HEADER_BYTES = 128  # a multiple of numpy's 64-byte alignment
+
+    def __init__(self, fpath, chunk_frames=64):
+        self._file = open(fpath, "wb")
+        self._chunk_frames = chunk_frames
+        self._frame_shape = None
+        self._dtype = None
+        self._frame_bytes = None
+        self._capacity = 0
+        self.length = 0
+
+    def _write_header(self):
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(self._dtype),
+                "fortran_order": False,
+                "shape": (self.length, *self._frame_shape),
+            }
+        ).encode("latin1")
+        preamble = np.lib.format.MAGIC_PREFIX + bytes([1, 0])
+        pad = self.HEADER_BYTES - len(preamble) - 2 - len(header) - 1
+        if pad < 0:
+            raise ValueError("Frame shape is too large for the reserved header.")
+        header += b" " * pad + b"\n"
+        self._file.seek(0)
+        self._file.write(preamble + len(header).to_bytes(2, "little") + header)
+
+    def append(self, frame):
+        "Write frame at the end of the stack and return its index."
+        frame = np.ascontiguousarray(frame)
+        if self._frame_shape is None:
+            self._frame_shape = frame.shape
+            self._dtype = frame.dtype
+            self._frame_bytes = frame.nbytes
+        elif frame.shape != self._frame_shape or frame.dtype != self._dtype:
+            raise ValueError(
+                f"Expected frames of shape {self._frame_shape} and dtype "
+                f"{self._dtype}, got {frame.shape} and {frame.dtype}."
+            )
+        if self.length == self._capacity:
+            self._capacity += self._chunk_frames
+            self._file.truncate(self.HEADER_BYTES + self._capacity * self._frame_bytes)
+        self._file.seek(self.HEADER_BYTES + self.length * self._frame_bytes)
+        self._file.write(frame.data)
+        index = self.length
+        self.length += 1
+        self._write_header()
+        self._file.flush()
+        return index
+
+    def close(self):
+        if self._frame_shape is not None:
+            self._file.truncate(self.HEADER_BYTES + self.length * self._frame_bytes)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class _BackgroundWriter:
+    """
+    Run file writes, in order, on one background thread.
+
+    At most ``max_pending`` writes may be queued; beyond that, submit()
+    blocks, which applies back-pressure to the caller instead of letting
+    memory grow without bound. Queue depth and the latency of the most
+    recent write are published to the given Signals.
+    """
+
+    def __init__(self, queue_depth, write_latency, max_pending=16):
+        self._queue = _queue.Queue(maxsize=max_pending)
+        self._queue_depth = queue_depth
+        self._write_latency = write_latency
+        self._error = None
+        self._thread = _threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+        # The thread is a daemon, so finish pending writes before exit.
+        _atexit.register(self._queue.join)
+
+    def _worker(self):
+        while True:
+            func, args = self._queue.get()
+            t0 = _time.monotonic()
+            try:
+                func(*args)
+            except Exception as err:
+                self._error = err
+            finally:
+                self._write_latency.put(_time.monotonic() - t0)
+                self._queue.task_done()
+                self._queue_depth.put(self._queue.unfinished_tasks)
+
+    def submit(self, func, *args):
+        self._queue.put((func, args))
+        self._queue_depth.put(self._queue.unfinished_tasks)
+
+    def flush(self):
+        "Block until all submitted writes are done; re-raise any failure."
+        self._queue.join()
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+
 class ArraySignal(EpicsSignalBase):
+    """
+    Signal for an image PV that writes each reading to disk.
+
+    While staged (``stack_frames = True``, the default), every frame of a
+    run is appended to one .npy stack referenced by a single Resource, and
+    each Datum carries only the frame index. Otherwise, every trigger
+    writes a separate .npy file with its own Resource.
+
+    With ``async_writes = True`` (the default), trigger() returns once the
+    frame has been read and leaves writing it to a background thread. If
+    ``wait_for_writes = True`` (the default), unstage() blocks until every
+    file is written and closed; otherwise writes finish in the background.
+    The ``write_queue_depth`` and ``write_latency`` attributes are Signals
+    reporting the number of pending writes and the duration in seconds of
+    the most recent one.
+    """
+
+    stack_frames = True
+    async_writes = True
+    wait_for_writes = True
+
     def __init__(self, read_pv, **kwargs):
         super().__init__(read_pv, **kwargs)
         cl = self.cl
@@ -113,25 +276,76 @@ class ArraySignal(EpicsSignalBase):
 
         self._last_ret = None
         self._asset_docs_cache = []
+        self._stack = None
+        self._datum_factory = None
+        self._frames_submitted = 0
+        self._writer = None
+        self.write_queue_depth = Signal(
+            name=f"{self.name}_write_queue_depth", value=0
+        )
+        self.write_latency = Signal(name=f"{self.name}_write_latency", value=0.0)
+
+    def _write(self, func, *args):
+        if not self.async_writes:
+            func(*args)
+            return
+        if self._writer is None:
+            self._writer = _BackgroundWriter(
+                self.write_queue_depth, self.write_latency
+            )
+        self._writer.submit(func, *args)
+
+    def stage(self):
+        if self.stack_frames:
+            os.makedirs("/tmp/demo", exist_ok=True)
+            resource, self._datum_factory = resource_factory(
+                spec="npy_FRAMEWISE",
+                root="/tmp",
+                resource_path=f"demo/{uuid.uuid4()}.npy",
+                resource_kwargs={},
+                path_semantics="posix",
+            )
+            self._asset_docs_cache.append(("resource", resource))
+            fpath = Path(resource["root"]) / resource["resource_path"]
+            self._stack = _NpyStackWriter(fpath)
+            self._frames_submitted = 0
+        return [self]
+
+    def unstage(self):
+        if self._stack is not None:
+            self._write(self._stack.close)
+        self._stack = self._datum_factory = None
+        if self._writer is not None and self.wait_for_writes:
+            self._writer.flush()
+        return [self]
 
     def trigger(self):
-        os.makedirs("/tmp/demo", exist_ok=True)
+        if self._stack is None:
+            os.makedirs("/tmp/demo", exist_ok=True)
         st = super().trigger()
         ret = super().read()
         val = ret[self.name]["value"].reshape(self._size_pv.get())
 
-        resource, datum_factory = resource_factory(
-            spec="npy",
-            root="/tmp",
-            resource_path=f"demo/{uuid.uuid4()}.npy",
-            resource_kwargs={},
-            path_semantics="posix",
-        )
-        datum = datum_factory({})
-        self._asset_docs_cache.append(("resource", resource))
-        self._asset_docs_cache.append(("datum", datum))
-        fpath = Path(resource["root"]) / resource["resource_path"]
-        np.save(fpath, val)
+        if self._stack is not None:
+            # Writes run in submission order, so the index is known now.
+            frame_no = self._frames_submitted
+            self._frames_submitted += 1
+            self._write(self._stack.append, val)
+            datum = self._datum_factory({"frame_no": frame_no})
+            self._asset_docs_cache.append(("datum", datum))
+        else:
+            resource, datum_factory = resource_factory(
+                spec="npy",
+                root="/tmp",
+                resource_path=f"demo/{uuid.uuid4()}.npy",
+                resource_kwargs={},
+                path_semantics="posix",
+            )
+            datum = datum_factory({})
+            self._asset_docs_cache.append(("resource", resource))
+            self._asset_docs_cache.append(("datum", datum))
+            fpath = Path(resource["root"]) / resource["resource_path"]
+            self._write(np.save, fpath, val)
 
         ret[self.name]["value"] = datum["datum_id"]
         self._last_ret = ret
@@ -163,6 +377,14 @@ class Spot(Device):
     exp = Component(EpicsSignal, ":exp", kind="config")
     shutter_open = Component(EpicsSignal, ":shutter_open", kind="config")
 
+    def stage(self):
+        devices = super().stage()
+        return devices + self.img.stage()
+
+    def unstage(self):
+        devices = self.img.unstage()
+        return super().unstage() + devices
+
     def collect_asset_docs(self):
         yield from self.img.collect_asset_docs()
 
@@ -170,6 +392,74 @@ class Spot(Device):
         return self.img.trigger()
 
 
+def wait_for_connections(objs, timeout=10):
+    """
+    Wait for many Devices and Signals to connect, concurrently.
+
+    Every object waits in its own thread against one overall deadline, so
+    startup takes as long as the slowest object rather than the sum of all
+    of them, and each unreachable IOC costs at most one timeout in total.
+    A table of per-object connection time is printed.
+
+    Parameters
+    ----------
+    objs : list
+        Devices and/or Signals
+    timeout : float, optional
+        Overall deadline in seconds
+
+    Returns
+    -------
+    latencies : dict
+        Maps each object's name to its connection time in seconds, or None
+        if it failed to connect.
+
+    Raises
+    ------
+    TimeoutError
+        If any object fails to connect before the deadline.
+    Exception
+        Any other error raised while connecting is re-raised unchanged,
+        after the table is printed.
+    """
+    if not objs:
+        return {}
+    t0 = _time.monotonic()
+    deadline = t0 + timeout
+
+    def wait(obj):
+        obj.wait_for_connection(timeout=max(deadline - _time.monotonic(), 0))
+        return _time.monotonic() - t0
+
+    latencies = {}
+    failures = {}
+    with _futures.ThreadPoolExecutor(max_workers=len(objs)) as executor:
+        futures = {obj.name: executor.submit(wait, obj) for obj in objs}
+        for name, future in futures.items():
+            try:
+                latencies[name] = future.result()
+            except Exception as err:
+                latencies[name] = None
+                failures[name] = err
+
+    width = max(len(name) for name in latencies)
+    for name, latency in latencies.items():
+        if latency is None:
+            status = f"FAILED ({type(failures[name]).__name__})"
+        else:
+            status = f"{latency * 1000:8.1f} ms"
+        print(f"{name:<{width}}  {status}")
+    for err in failures.values():
+        if not isinstance(err, TimeoutError):
+            raise err
+    if failures:
+        raise TimeoutError(
+            "Failed to connect: "
+            + "; ".join(f"{name}: {err}" for name, err in failures.items())
+        )
+    return latencies
+
+
 det = ph = Det("mini:ph", name="ph")
 edge = Det("mini:edge", name="edge")
 slit = Det("mini:slit", name="slit")
@@ -184,14 +474,6 @@ mtr_spoty = EpicsSignal("mini:dot:mtry", name="motor_spoty", put_complete=True)
 
 I = EpicsSignal("mini:current", name="I")
 
-# Once https://github.com/bluesky/ophyd/pull/863 is released
-# this can be done more succinctly.
-ph.wait_for_connection()
-edge.wait_for_connection()
-slit.wait_for_connection()
-motor_ph.wait_for_connection()
-motor_edge.wait_for_connection()
-spot.wait_for_connection()
-mtr_spotx.wait_for_connection()
-mtr_spoty.wait_for_connection()
-I.wait_for_connection()
+wait_for_connections(
+    [ph, edge, slit, motor_ph, motor_edge, spot, mtr_spotx, mtr_spoty, I]
+)
@@ -1,21 +1,44 @@
+import concurrent.futures
+import contextlib
+import errno
+import hashlib
+import json
+import os
 import pathlib
 import requests
 import shutil
 import sys
+import time
 import zipfile
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
-def _download_file(url, local_filename=None):
+
+def _download_file(url, local_filename=None, sha256=None, chunk_size=2 ** 20):
     """Download a file from the provided url.
 
     Credit: https://stackoverflow.com/a/39217788/4143531.
 
+    The download is streamed into ``<local_filename>.part`` and renamed only
+    once it is complete (and, if ``sha256`` is given, verified), so an
+    existing ``local_filename`` is always a complete download. An interrupted
+    download is resumed from the end of the ``.part`` file with an HTTP Range
+    request, if the server supports it.
+
     Parameters
     ----------
     url: str
         a download link to the file
     local_filename: str, optional
         a desired file name for the downloaded file
+    sha256: str, optional
+        expected SHA-256 hex digest of the file
+    chunk_size: int, optional
+        number of bytes to read at a time
 
     Returns
     -------
@@ -25,27 +48,421 @@ def _download_file(url, local_filename=None):
         local_filename = url.split("/")[-1]
     local_filename = pathlib.Path(local_filename)
     if local_filename.exists():
+        if sha256 is not None:
+            _verify_checksum(local_filename, sha256)
         return local_filename
-    with requests.get(url, stream=True) as r:
-        with open(local_filename, "wb") as f:
-            shutil.copyfileobj(r.raw, f)
+
+    part_filename = local_filename.with_name(local_filename.name + ".part")
+    offset = part_filename.stat().st_size if part_filename.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, stream=True, headers=headers) as r:
+        if offset and r.status_code == 416:
+            # Nothing left to send: the .part file may already be complete,
+            # if an earlier run stopped just before renaming it.
+            expected = _content_range_total(r.headers.get("Content-Range"))
+            if expected != offset:
+                # It does not match this file; start over.
+                part_filename.unlink()
+                return _download_file(url, local_filename, sha256, chunk_size)
+        else:
+            r.raise_for_status()
+            if offset and r.status_code != 206:
+                # The server ignored the Range header; start over.
+                offset = 0
+            expected = r.headers.get("Content-Length")
+            expected = offset + int(expected) if expected is not None else None
+            progress = _Progress(offset, expected)
+            try:
+                with open(part_filename, "ab" if offset else "wb") as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        progress.update(len(chunk))
+            finally:
+                progress.finish()
+
+    size = part_filename.stat().st_size
+    if expected is not None and size != expected:
+        raise IOError(
+            f"Download of {url} is incomplete: got {size} of {expected} bytes. "
+            "Run again to resume."
+        )
+    if sha256 is not None:
+        try:
+            _verify_checksum(part_filename, sha256)
+        except IOError:
+            part_filename.unlink()
+            raise
+    os.replace(part_filename, local_filename)
     return local_filename
 
 
-def _unpack_zip(file, dir_to_extract_to):
+def _content_range_total(content_range):
+    "The total length in a Content-Range header such as 'bytes */1234'."
+    try:
+        return int(content_range.rsplit("/", 1)[1])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def _sha256(filename, chunk_size=2 ** 20):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _verify_checksum(filename, sha256):
+    actual = _sha256(filename)
+    if actual != sha256.lower():
+        raise IOError(
+            f"Checksum mismatch for {filename}: expected sha256 {sha256}, "
+            f"got {actual}"
+        )
+
+
+class _Progress:
+    "Print download progress and throughput to stderr."
+
+    def __init__(self, done, total, interval=1.0):
+        self._done = done
+        self._start_done = done
+        self._total = total
+        self._interval = interval
+        self._t0 = self._last = time.monotonic()
+
+    def update(self, nbytes):
+        self._done += nbytes
+        now = time.monotonic()
+        if now - self._last >= self._interval:
+            self._last = now
+            self._report(now)
+
+    def finish(self):
+        self._report(time.monotonic())
+        print(file=sys.stderr)
+
+    def _report(self, now):
+        rate = (self._done - self._start_done) / max(now - self._t0, 1e-9)
+        total = "?" if self._total is None else f"{self._total / 2 ** 20:.1f}"
+        print(
+            f"\r{self._done / 2 ** 20:.1f}/{total} MiB ({rate / 2 ** 20:.1f} MiB/s)",
+            end="",
+            file=sys.stderr,
+        )
+
+
+def _unpack_zip(file, dir_to_extract_to, max_workers=None):
+    """
+    Extract every member of a zip archive, in parallel across threads.
+
+    Each thread opens its own handle on the archive, so members are read
+    and decompressed concurrently.
+    """
     with zipfile.ZipFile(file, "r") as zip_ref:
         files = zip_ref.filelist
-        zip_ref.extractall(dir_to_extract_to)
+    # Create every member's directory up front: zipfile creates missing
+    # parents with os.makedirs, which fails in whichever of two threads
+    # extracting into the same new directory loses the race. Archives need
+    # not have entries for their directories, so derive them from every
+    # member, dropping the path components that zipfile itself drops.
+    for info in files:
+        parts = [
+            part for part in info.filename.split("/") if part not in ("", ".", "..")
+        ]
+        if not info.is_dir():
+            parts = parts[:-1]
+        os.makedirs(os.path.join(dir_to_extract_to, *parts), exist_ok=True)
+
+    def extract(members):
+        with zipfile.ZipFile(file, "r") as zip_ref:
+            for info in members:
+                zip_ref.extract(info, dir_to_extract_to)
+
+    members = [info for info in files if not info.is_dir()]
+    if max_workers is None:
+        max_workers = min(len(members), os.cpu_count() or 1) or 1
+    chunks = [members[i::max_workers] for i in range(max_workers)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        # Consume the results so that any exception is raised here.
+        list(executor.map(extract, chunks))
     return files
 
 
+class DatasetCache:
+    """
+    A content-addressed cache of downloaded datasets, shared between processes.
+
+    Each archive is downloaded once, extracted under the SHA-256 digest of
+    its contents, and then linked into any number of destination directories.
+    The archive itself is deleted once it has been extracted. A JSON manifest
+    maps URLs to digests and records the size and last use of each dataset.
+    File locks make it safe for many kernels, and many users, to share one
+    cache directory: concurrent requests for the same URL cost one download.
+
+    Parameters
+    ----------
+    directory : str or Path, optional
+        Defaults to $BLUESKY_TUTORIAL_CACHE if set, else a per-user cache
+        directory. On a shared server, point this at a directory that all
+        users can write to (group-writable, with the setgid bit set).
+    max_bytes : int, optional
+        Evict least-recently-used datasets once the extracted datasets exceed
+        this many bytes in total. Default is 10 GiB.
+    """
+
+    def __init__(self, directory=None, *, max_bytes=10 * 2 ** 30):
+        if directory is None:
+            directory = os.environ.get("BLUESKY_TUTORIAL_CACHE")
+        if directory is None:
+            import appdirs
+
+            directory = appdirs.user_cache_dir("bluesky", "tutorial_utils")
+        self.directory = pathlib.Path(directory).expanduser()
+        self.max_bytes = max_bytes
+        for name in ("data", "downloads", "locks"):
+            (self.directory / name).mkdir(parents=True, exist_ok=True)
+
+    @property
+    def _manifest_path(self):
+        return self.directory / "manifest.json"
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {"urls": {}, "datasets": {}}
+
+    def _write_manifest(self, manifest):
+        tmp = self._manifest_path.with_name(f"manifest.json.{os.getpid()}")
+        with open(tmp, "w") as file:
+            json.dump(manifest, file, indent=1)
+        os.replace(tmp, self._manifest_path)
+
+    def _lock(self, name):
+        return _FileLock(self.directory / "locks" / f"{name}.lock")
+
+    def fetch(self, url, sha256=None):
+        """
+        Return the directory holding the extracted contents of the zip at url.
+
+        The archive is downloaded and extracted only if the cache does not
+        already have it. If sha256 is given, it identifies the dataset, and
+        the download is verified against it.
+        """
+        url_key = hashlib.sha256(url.encode()).hexdigest()
+        # Held for the whole download, so other processes wait for it rather
+        # than downloading the same thing.
+        with self._lock(url_key):
+            with self._lock("manifest"):
+                manifest = self._read_manifest()
+                digest = sha256.lower() if sha256 else manifest["urls"].get(url)
+                if digest in manifest["datasets"]:
+                    self._touch(manifest, digest)
+                    return self.directory / "data" / digest
+
+            archive = self.directory / "downloads" / f"{url_key}.zip"
+            print("Downloading...", file=sys.stderr)
+            _download_file(url, local_filename=archive, sha256=sha256)
+            digest = _sha256(archive)
+            data = self.directory / "data" / digest
+            if not data.exists():
+                tmp = data.with_name(f"{digest}.{os.getpid()}.tmp")
+                shutil.rmtree(tmp, ignore_errors=True)
+                print("Extracting...", file=sys.stderr)
+                _unpack_zip(archive, tmp)
+                # Cached files are shared through hard links; protect them.
+                for file in tmp.rglob("*"):
+                    if file.is_file():
+                        file.chmod(0o444)
+                try:
+                    os.rename(tmp, data)
+                except OSError:
+                    # The same contents arrived from another URL meanwhile.
+                    shutil.rmtree(tmp)
+            archive.unlink()
+
+            with self._lock("manifest"):
+                manifest = self._read_manifest()
+                manifest["urls"][url] = digest
+                manifest["datasets"][digest] = {
+                    "size": sum(f.stat().st_size for f in data.rglob("*")),
+                    "last_used": time.time(),
+                }
+                self._evict(manifest, keep=digest)
+                self._write_manifest(manifest)
+            return data
+
+    def _touch(self, manifest, digest):
+        manifest["datasets"][digest]["last_used"] = time.time()
+        self._write_manifest(manifest)
+
+    def _evict(self, manifest, keep):
+        "Drop least-recently-used datasets, other than keep, until under size."
+        datasets = manifest["datasets"]
+        total = sum(entry["size"] for entry in datasets.values())
+        for digest in sorted(datasets, key=lambda d: datasets[d]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            total -= datasets.pop(digest)["size"]
+            manifest["urls"] = {
+                url: d for url, d in manifest["urls"].items() if d != digest
+            }
+            doomed = self.directory / "data" / f"{digest}.{os.getpid()}.evicted"
+            os.rename(self.directory / "data" / digest, doomed)
+            for file in doomed.rglob("*"):
+                # Let rmtree unlink read-only files on every platform.
+                file.chmod(0o644)
+            shutil.rmtree(doomed)
+
+    def materialize(self, url, dest, *, sha256=None, link="hardlink"):
+        """
+        Populate dest with the contents of the zip at url.
+
+        Parameters
+        ----------
+        url : str
+        dest : str or Path
+            Must not already exist. It appears only once fully populated.
+        sha256 : str, optional
+        link : {"hardlink", "symlink", "copy"}, optional
+            How files are placed in dest. Hard links fall back to symbolic
+            links across filesystems or where the OS forbids linking another
+            user's files. Symbolic links break if the dataset is evicted;
+            hard links and copies do not. Default is "hardlink".
+
+        Returns
+        -------
+        files : list of Path
+            The files placed in dest, relative to dest
+        """
+        if link not in ("hardlink", "symlink", "copy"):
+            raise ValueError(
+                f"link must be 'hardlink', 'symlink' or 'copy', not {link!r}"
+            )
+        dest = pathlib.Path(dest)
+        tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+        # Left behind by an earlier, interrupted call from a process with
+        # the same pid; linking into it would fail with FileExistsError.
+        shutil.rmtree(tmp, ignore_errors=True)
+        files = []
+        # Hold the manifest lock so that the dataset cannot be evicted while
+        # it is being linked. It may have been evicted since fetch returned.
+        while True:
+            source = self.fetch(url, sha256=sha256)
+            with self._lock("manifest"):
+                if not source.exists():
+                    continue
+                for path in sorted(source.rglob("*")):
+                    relative = path.relative_to(source)
+                    target = tmp / relative
+                    if path.is_dir():
+                        target.mkdir(parents=True, exist_ok=True)
+                        continue
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    _place(path, target, link)
+                    files.append(relative)
+            break
+        os.rename(tmp, dest)
+        return files
+
+
+def _place(source, target, link):
+    if link == "hardlink":
+        try:
+            os.link(source, target)
+            return
+        except OSError as err:
+            if err.errno not in (errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK):
+                raise
+        link = "symlink"
+    if link == "symlink":
+        os.symlink(source, target)
+    else:
+        shutil.copyfile(source, target)
+
+
+class _FileLock:
+    "An exclusive, blocking, inter-process lock on a file."
+
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self._path, "a+b")
+        self._file.seek(0)
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ten seconds; keep waiting.
+                    pass
+        return self
+
+    def __exit__(self, *exc_info):
+        with contextlib.suppress(OSError):
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
 def rsoxs_simulation_data(
-    dest="rsoxs_simulation_data", *, path=None, cache_path=None
+    dest="rsoxs_simulation_data",
+    *,
+    path=None,
+    cache_path=None,
+    cache_max_bytes=10 * 2 ** 30,
+    sha256=None,
+    link="hardlink",
 ):
     """
     Download and decompress dataset unless destination already exists.
 
-    Return False if destination exists and there is nothing to do, True otherwise.
+    The dataset is kept in a :class:`DatasetCache` and linked into the
+    destination, so it is downloaded and extracted once per cache, not once
+    per destination. The cache is per user unless $BLUESKY_TUTORIAL_CACHE
+    (or cache_path) points at a directory shared by all users: for users to
+    share one download, that directory must be writable by all of them, e.g.
+    group-owned and group-writable, with the setgid bit set, and used with a
+    umask of 002.
+
+    An interrupted download is resumed on the next call. Pass ``sha256`` to
+    verify the downloaded archive.
+
+    Parameters
+    ----------
+    dest : str, optional
+    path : str or Path, optional
+        Directory in which to create dest. Defaults to the current directory.
+    cache_path : str or Path, optional
+        Root directory of the DatasetCache. The zip archive is only kept
+        there until it has been extracted; the extracted files are kept, up
+        to cache_max_bytes. Defaults to $BLUESKY_TUTORIAL_CACHE if set, else
+        a per-user cache directory.
+    cache_max_bytes : int, optional
+        See :class:`DatasetCache`.
+    sha256 : str, optional
+    link : {"hardlink", "symlink", "copy"}, optional
+        See :meth:`DatasetCache.materialize`.
+
+    Returns
+    -------
+    files : list of Path
+        The paths, relative to dest, of the files placed in dest, or an
+        empty list if dest already exists. (This used to be a list of
+        zipfile.ZipInfo.)
     """
 
     if path is None:
@@ -60,20 +477,5 @@ def rsoxs_simulation_data(
     # https://www.dropbox.com/home/DAMA/Conferences%20%26%20Meetings/FY2020/NSLS-II%20%26%20CFN%20Users'%20meeting%20(May%202020)/200513_xArray/nxs
     URL = "https://www.dropbox.com/sh/8z5jzb4iu7o3unj/AADQUqm2_oGgIxRBC8uuO6XWa?dl=1"
 
-    # Download a zip-archive with the *.nxs data files.
-    print("Downloading...", file=sys.stderr)
-    if cache_path is None:
-        cache_path = pathlib.Path.cwd()
-    else:
-        cache_path = pathlib.Path(cache_path).expanduser()
-
-    cache_path.mkdir(exist_ok=True)
-    rsoxs_zip = _download_file(
-        URL, local_filename=cache_path / "rsoxs_simulation_data.zip"
-    )
-
-    # Unpack it.
-    print("Extracting...", file=sys.stderr)
-    files = _unpack_zip(rsoxs_zip, dest)
-
-    return files
+    cache = DatasetCache(cache_path, max_bytes=cache_max_bytes)
+    return cache.materialize(URL, dest, sha256=sha256, link=link)
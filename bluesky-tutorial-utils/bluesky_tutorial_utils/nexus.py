@@ -1,5 +1,11 @@
+import collections
+import contextlib
+import os
 import pathlib
 import datetime
+import functools
+import threading
+import weakref
 import six
 import h5py
 import warnings
@@ -10,8 +16,6 @@ import dask
 
 
 def initNexus(fileName, simulation_variables=None, overwrite=False):
-    timestamp = "T".join(str(datetime.datetime.now()).split())
-
     fileName = pathlib.Path(fileName)
     if fileName.exists() and (not overwrite):
         raise FileExistsError(
@@ -20,114 +24,176 @@ def initNexus(fileName, simulation_variables=None, overwrite=False):
 
     # create the HDF5 NeXus file
     with h5py.File(fileName, "w") as f:
-        # point to the default data to be plotted
-        f.attrs["default"] = "entry"
-        # give the HDF5 root some more attributes
-        f.attrs["file_name"] = str(fileName.parts[-1])
-        f.attrs["file_time"] = timestamp
-        f.attrs[
-            "instrument"
-        ] = "CyRSoXS v"  # @TODO: learn the CyRSoXS version stamp and embed here
-        f.attrs["creator"] = "CyRSoXS output packager"
-        f.attrs["NeXus_version"] = "4.3.0"
-        f.attrs["HDF5_version"] = six.u(h5py.version.hdf5_version)
-        f.attrs["h5py_version"] = six.u(h5py.version.version)
-
-        # create the NXentry group
-        nxentry = f.create_group("entry")
-        nxentry.attrs["NX_class"] = "NXentry"
-        nxentry.attrs["canSAS_class"] = "SASentry"
-        nxentry.attrs["default"] = "data"
-        nxentry.create_dataset("title", data="SIMULATION NAME GOES HERE")  # @TODO
-
-        # create the NXinstrument metadata group
-        nxinstr = nxentry.create_group("instrument")
-        nxinstr.attrs["NX_class"] = "NXinstrument"
-        nxinstr.attrs["canSAS_class"] = "SASinstrument"
-
-        nxprocess = nxinstr.create_group("simulation_engine")
-        nxprocess.attrs["NX_class"] = "NXprocess"
-        nxprocess.attrs["canSAS_class"] = "SASprocess"
-        nxprocess.attrs["name"] = "CyRSoXS Simulation Engine"
-        nxprocess.attrs[
-            "date"
-        ] = timestamp  # @TODO: get timestamp from simulation run and embed here.
-        nxprocess.attrs[
-            "description"
-        ] = "Simulation of RSoXS pattern from optical constants del/beta and morphology"
-
-        sim_notes = nxprocess.create_group("notes")
-        sim_notes.attrs["NX_class"] = "NXnote"
-
-        sim_notes.attrs["description"] = "Simulation Engine Input Parameters/Run Data"
-        sim_notes.attrs["author"] = "CyRSoXS PostProcessor"
-        sim_notes.attrs["data"] = "Run metadata goes here"  # @TODO
-
-        if simulation_variables is not None:
-            for key, value in simulation_variables.items():
-                if "energy" in key.lower():
-                    units = "eV"
-                elif "angle" in key.lower():
-                    units = "degree"
-                elif "physsize" in key.lower():
-                    units = "nm"  # @TODO: is this correct?
-                else:
-                    units = ""
-
-                metads = sim_notes.create_dataset(key, data=value)
-                metads.attrs["units"] = units
-        nxsample = nxentry.create_group("sample")
-        nxsample.attrs["NX_class"] = "NXsample"
-        nxsample.attrs["canSAS_class"] = "SASsample"
-
-        nxsample.attrs["name"] = "SAMPLE NAME GOES HERE"
-        nxsample.attrs["description"] = "SAMPLE DESCRIPTION GOES HERE"
-        nxsample.attrs["type"] = "simulated data"
-
-        # #nxsample.create_dataset(u'component',['component 1','component 2'])
-        # optics = nxsample.create_group(u'optical_constants')
-        # comp = optics.create_group(u'component 1')
-        # #comp.create_dataset
-
+        _init_nexus(f, fileName, simulation_variables)
 
-def checkFile(fileName, simulation_variables):
-    if simulation_variables is None:
-        warnings.warn(
-            "Cannot verify that .nxs matches data without simulation_variables defined."
-        )
 
-    with h5py.File(fileName, "r") as f:
-        notes = f["entry/instrument/simulation_engine/notes"]
-        for key, value in simulation_variables.items():
-            if key not in notes:
-                raise ValueError(
-                    f'checkFile Failed! Simulation variable "{key}" not found in {fileName}'
-                )
-            if notes[key][()] != value:
-                raise ValueError(
-                    f"checkFile Failed! Simulation variable {key}={value} doesn't match file value: {key}={notes[key][()]}"
-                )
-
-
-def writeSingleImageQxQy(
-    fileName, img, qx, qy, simulation_variables=None, group_name="sasdata_singleimg"
-):
+def _init_nexus(f, fileName, simulation_variables):
+    "Lay out the NeXus skeleton in an open, empty h5py.File."
     timestamp = "T".join(str(datetime.datetime.now()).split())
 
-    fileName = pathlib.Path(fileName)
-    if not fileName.exists():
-        initNexus(fileName, simulation_variables)
+    # point to the default data to be plotted
+    f.attrs["default"] = "entry"
+    # give the HDF5 root some more attributes
+    f.attrs["file_name"] = str(fileName.parts[-1])
+    f.attrs["file_time"] = timestamp
+    f.attrs[
+        "instrument"
+    ] = "CyRSoXS v"  # @TODO: learn the CyRSoXS version stamp and embed here
+    f.attrs["creator"] = "CyRSoXS output packager"
+    f.attrs["NeXus_version"] = "4.3.0"
+    f.attrs["HDF5_version"] = six.u(h5py.version.hdf5_version)
+    f.attrs["h5py_version"] = six.u(h5py.version.version)
+
+    # create the NXentry group
+    nxentry = f.create_group("entry")
+    nxentry.attrs["NX_class"] = "NXentry"
+    nxentry.attrs["canSAS_class"] = "SASentry"
+    nxentry.attrs["default"] = "data"
+    nxentry.create_dataset("title", data="SIMULATION NAME GOES HERE")  # @TODO
+
+    # create the NXinstrument metadata group
+    nxinstr = nxentry.create_group("instrument")
+    nxinstr.attrs["NX_class"] = "NXinstrument"
+    nxinstr.attrs["canSAS_class"] = "SASinstrument"
+
+    nxprocess = nxinstr.create_group("simulation_engine")
+    nxprocess.attrs["NX_class"] = "NXprocess"
+    nxprocess.attrs["canSAS_class"] = "SASprocess"
+    nxprocess.attrs["name"] = "CyRSoXS Simulation Engine"
+    nxprocess.attrs[
+        "date"
+    ] = timestamp  # @TODO: get timestamp from simulation run and embed here.
+    nxprocess.attrs[
+        "description"
+    ] = "Simulation of RSoXS pattern from optical constants del/beta and morphology"
+
+    sim_notes = nxprocess.create_group("notes")
+    sim_notes.attrs["NX_class"] = "NXnote"
+
+    sim_notes.attrs["description"] = "Simulation Engine Input Parameters/Run Data"
+    sim_notes.attrs["author"] = "CyRSoXS PostProcessor"
+    sim_notes.attrs["data"] = "Run metadata goes here"  # @TODO
 
     if simulation_variables is not None:
-        checkFile(fileName, simulation_variables)
+        for key, value in simulation_variables.items():
+            if "energy" in key.lower():
+                units = "eV"
+            elif "angle" in key.lower():
+                units = "degree"
+            elif "physsize" in key.lower():
+                units = "nm"  # @TODO: is this correct?
+            else:
+                units = ""
+
+            metads = sim_notes.create_dataset(key, data=value)
+            metads.attrs["units"] = units
+    nxsample = nxentry.create_group("sample")
+    nxsample.attrs["NX_class"] = "NXsample"
+    nxsample.attrs["canSAS_class"] = "SASsample"
+
+    nxsample.attrs["name"] = "SAMPLE NAME GOES HERE"
+    nxsample.attrs["description"] = "SAMPLE DESCRIPTION GOES HERE"
+    nxsample.attrs["type"] = "simulated data"
+
+    # #nxsample.create_dataset(u'component',['component 1','component 2'])
+    # optics = nxsample.create_group(u'optical_constants')
+    # comp = optics.create_group(u'component 1')
+    # #comp.create_dataset
 
-    # create the HDF5 NeXus file
-    with h5py.File(fileName, "a") as f:
-        # update the timestamp
-        f.attrs["file_time"] = timestamp
 
-        nxentry = f["entry"]
+def checkFile(fileName, simulation_variables):
+    if simulation_variables is None:
+        warnings.warn(
+            "Cannot verify that .nxs matches data without simulation_variables defined."
+        )
 
+    with h5py.File(fileName, "r") as f:
+        _check_notes(f, fileName, simulation_variables)
+
+
+def _check_notes(f, fileName, simulation_variables):
+    "Check simulation_variables against the notes in an open h5py.File."
+    notes = f["entry/instrument/simulation_engine/notes"]
+    for key, value in simulation_variables.items():
+        if key not in notes:
+            raise ValueError(
+                f'checkFile Failed! Simulation variable "{key}" not found in {fileName}'
+            )
+        if notes[key][()] != value:
+            raise ValueError(
+                f"checkFile Failed! Simulation variable {key}={value} doesn't match file value: {key}={notes[key][()]}"
+            )
+
+
+class NexusSession:
+    """
+    An open .nxs file, for writing many images with one open and one check.
+
+    The file is created, with the NeXus skeleton, if it does not exist.
+    Otherwise simulation_variables, if given, are checked against it once.
+    The file's timestamp is updated and the file is flushed and closed once,
+    on exit.
+
+    Parameters
+    ----------
+    fileName : str or Path
+    simulation_variables : dict, optional
+
+    Examples
+    --------
+    >>> with NexusSession("sim.nxs", simulation_variables) as nxs:
+    ...     nxs.write_qxqy(img, qx, qy)
+    ...     nxs.write_chiq(img_chi, chi, q)
+    ...     nxs.write_energy_series(images, energies)
+    """
+
+    def __init__(self, fileName, simulation_variables=None):
+        self.fileName = pathlib.Path(fileName)
+        self.simulation_variables = simulation_variables
+        self._file = None
+        self._modified = False
+
+    def open(self):
+        created = not self.fileName.exists()
+        f = self._open_file()
+        try:
+            if created:
+                _init_nexus(f, self.fileName, self.simulation_variables)
+            elif self.simulation_variables is not None:
+                _check_notes(f, self.fileName, self.simulation_variables)
+        except Exception:
+            f.close()
+            raise
+        self._file = f
+        return self
+
+    def _open_file(self):
+        return h5py.File(self.fileName, "a")
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._modified:
+            timestamp = "T".join(str(datetime.datetime.now()).split())
+            self._file.attrs["file_time"] = timestamp
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _entry(self):
+        if self._file is None:
+            raise RuntimeError(f"{self.fileName} is not open.")
+        self._modified = True
+        return self._file["entry"]
+
+    def write_qxqy(self, img, qx, qy, group_name="sasdata_singleimg"):
+        "Write an image I(Qx, Qy) as a new NXdata group."
+        nxentry = self._entry()
         nxdata = nxentry.create_group(group_name)
         nxdata.attrs["NX_class"] = "NXdata"
         nxdata.attrs["canSAS_class"] = "SASdata"
@@ -155,31 +221,9 @@ def writeSingleImageQxQy(
         ds.attrs["units"] = "1/angstrom"
         ds.attrs["long_name"] = "Qy (A^-1)"  # suggested Y axis plot label
 
-
-def writeSingleImageChiQ(
-    fileName,
-    img,
-    chi,
-    q,
-    simulation_variables=None,
-    group_name="sasdata_singleimg_unwrap",
-):
-    timestamp = "T".join(str(datetime.datetime.now()).split())
-
-    fileName = pathlib.Path(fileName)
-    if not fileName.exists():
-        initNexus(fileName, simulation_variables)
-
-    if simulation_variables is not None:
-        checkFile(fileName, simulation_variables)
-
-    # create the HDF5 NeXus file
-    with h5py.File(fileName, "a") as f:
-        # update the timestamp
-        f.attrs["file_time"] = timestamp
-
-        nxentry = f["entry"]
-
+    def write_chiq(self, img, chi, q, group_name="sasdata_singleimg_unwrap"):
+        "Write an unwrapped image I(chi, Q) as a new NXdata group."
+        nxentry = self._entry()
         nxdata = nxentry.create_group(group_name)
         nxdata.attrs["NX_class"] = "NXdata"
         nxdata.attrs["canSAS_class"] = "SASdata"
@@ -209,40 +253,254 @@ def writeSingleImageChiQ(
             "long_name"
         ] = "azimuthal angle chi (deg)"  # suggested Y axis plot label
 
+    def write_energy_series(
+        self,
+        da_image_list,
+        energies,
+        chi=False,
+        group_name_mod="",
+        *,
+        chunks=None,
+        compression="gzip",
+        compression_opts=4,
+        shuffle=True,
+    ):
+        """
+        Write a series of images, one per energy, as a new NXdata group.
+
+        See :func:`writeImageEnergySeries` for the parameters.
+        """
+        _write_energy_series(
+            self._entry(),
+            "sasdata_energyseries" + group_name_mod,
+            da_image_list,
+            energies,
+            chi=chi,
+            chunks=chunks,
+            compression=compression,
+            compression_opts=compression_opts,
+            shuffle=shuffle,
+        )
 
-def read_singleimg_nxs(fname, sasdata="", lazy=False):
-    if sasdata:
-        sasdata = "sasdata_singleimg" + "_" + sasdata
-    else:
-        sasdata = "sasdata_singleimg"
 
-    h5 = h5py.File(fname, "r")
-    if sasdata not in h5["entry"]:
-        raise ValueError(f'Single image sasdata "{sasdata}" not found in {fname}')
+def writeSingleImageQxQy(
+    fileName, img, qx, qy, simulation_variables=None, group_name="sasdata_singleimg"
+):
+    with NexusSession(fileName, simulation_variables) as nxs:
+        nxs.write_qxqy(img, qx, qy, group_name=group_name)
 
-    signal_label = h5["entry"][sasdata].attrs["signal"]
-    if lazy:
-        warnings.warn(
-            "Using delayed,lazy loading for intensity data. USER IS RESPONSIBLE FOR CLOSING THE H5 FILE."
+
+def writeSingleImageChiQ(
+    fileName,
+    img,
+    chi,
+    q,
+    simulation_variables=None,
+    group_name="sasdata_singleimg_unwrap",
+):
+    with NexusSession(fileName, simulation_variables) as nxs:
+        nxs.write_chiq(img, chi, q, group_name=group_name)
+
+
+class ZarrSession(NexusSession):
+    """
+    A NexusSession that writes the same layout to a Zarr directory store.
+
+    Groups, arrays and attributes mirror the NeXus file, so the store can
+    be read back with :func:`read_singleimg_zarr` and
+    :func:`read_energyseries_zarr`. Every chunk is compressed with the same
+    codec; the HDF5 compression options of ``write_energy_series`` are
+    ignored. Unlike one HDF5 file, a Zarr store can be read by many threads
+    or processes in parallel. Requires zarr 3.
+
+    Parameters
+    ----------
+    store : str or Path
+    simulation_variables : dict, optional
+    compressor : zarr codec, optional
+        Default is Blosc zstd level 3 with byte shuffle, which is fast to
+        decompress.
+    """
+
+    def __init__(self, store, simulation_variables=None, *, compressor=None):
+        super().__init__(store, simulation_variables)
+        self.compressor = compressor
+
+    def _open_file(self):
+        import zarr
+
+        compressor = self.compressor
+        if compressor is None:
+            compressor = zarr.codecs.BloscCodec(
+                cname="zstd", clevel=3, shuffle="shuffle"
+            )
+        return _ZarrGroup(zarr.open_group(str(self.fileName), mode="a"), compressor)
+
+
+class _ZarrGroup:
+    "Just enough of the h5py.Group API, on a zarr Group, for the writers."
+
+    def __init__(self, group, compressor):
+        self._group = group
+        self._compressor = compressor
+        self.attrs = group.attrs
+
+    def __contains__(self, name):
+        return name in self._group
+
+    def __getitem__(self, name):
+        item = self._group[name]
+        if hasattr(item, "shape"):
+            return item
+        return type(self)(item, self._compressor)
+
+    def create_group(self, name):
+        return type(self)(self._group.create_group(name), self._compressor)
+
+    def create_dataset(
+        self, name, data=None, shape=None, dtype=None, chunks=None, **h5_filters
+    ):
+        if data is not None:
+            data = np.asarray(data)
+            shape, dtype = data.shape, data.dtype
+        if dtype.kind in "US":
+            array = self._group.create_array(name, shape=shape, dtype=str)
+        else:
+            array = self._group.create_array(
+                name,
+                shape=shape,
+                dtype=dtype,
+                chunks=chunks if isinstance(chunks, tuple) else "auto",
+                compressors=self._compressor,
+            )
+        if data is not None:
+            array[...] = data
+        return array
+
+    def close(self):
+        pass
+
+
+def write_qxqy_zarr(
+    store,
+    img,
+    qx,
+    qy,
+    simulation_variables=None,
+    group_name="sasdata_singleimg",
+    *,
+    compressor=None,
+):
+    "Zarr counterpart of :func:`writeSingleImageQxQy`. See :class:`ZarrSession`."
+    with ZarrSession(store, simulation_variables, compressor=compressor) as nxs:
+        nxs.write_qxqy(img, qx, qy, group_name=group_name)
+
+
+def write_chiq_zarr(
+    store,
+    img,
+    chi,
+    q,
+    simulation_variables=None,
+    group_name="sasdata_singleimg_unwrap",
+    *,
+    compressor=None,
+):
+    "Zarr counterpart of :func:`writeSingleImageChiQ`. See :class:`ZarrSession`."
+    with ZarrSession(store, simulation_variables, compressor=compressor) as nxs:
+        nxs.write_chiq(img, chi, q, group_name=group_name)
+
+
+def write_energy_series_zarr(
+    store,
+    da_image_list,
+    energies,
+    chi=False,
+    simulation_variables=None,
+    group_name_mod="",
+    *,
+    chunks=None,
+    compressor=None,
+):
+    "Zarr counterpart of :func:`writeImageEnergySeries`. See :class:`ZarrSession`."
+    with ZarrSession(store, simulation_variables, compressor=compressor) as nxs:
+        nxs.write_energy_series(
+            da_image_list, energies, chi=chi, group_name_mod=group_name_mod, chunks=chunks
         )
-        signal = dask.array.from_array(h5["entry"][sasdata][signal_label])
+
+
+def read_singleimg_zarr(store, sasdata="", lazy=False):
+    """
+    Zarr counterpart of :func:`read_singleimg_nxs`.
+
+    With lazy=True, the intensity is a dask array whose chunks can be read
+    in parallel.
+    """
+    return _read_zarr_nxdata(store, _singleimg_group(sasdata), lazy)
+
+
+def read_energyseries_zarr(store, remesh=False, chi=False, lazy=False):
+    "Zarr counterpart of :func:`read_energyseries`."
+    return _read_zarr_nxdata(store, _energyseries_group(remesh, chi), lazy)
+
+
+def _read_zarr_nxdata(store, sasdata, lazy):
+    import dask.array
+    import zarr
+
+    root = zarr.open_group(str(store), mode="r")
+    if sasdata not in root["entry"]:
+        raise ValueError(f'sasdata "{sasdata}" not found in {store}')
+    group = root["entry"][sasdata]
+    signal_label = group.attrs["signal"]
+    if lazy:
+        signal = dask.array.from_zarr(group[signal_label])
     else:
-        signal = h5["entry"][sasdata][signal_label][()]
+        signal = group[signal_label][...]
+    labels = group.attrs["I_axes"].split(",")
+    coords = {label: group[label][...] for label in labels}
 
-    ylabel, xlabel = h5["entry"][sasdata].attrs["I_axes"].split(",")
-    y = h5["entry"][sasdata][ylabel][()]
-    x = h5["entry"][sasdata][xlabel][()]
+    da = xr.DataArray(signal, dims=labels, coords=coords, name=signal_label)
+    da.attrs["lazy"] = lazy
+    return da
 
-    da = xr.DataArray(
-        signal, dims=[ylabel, xlabel], coords={ylabel: y, xlabel: x}, name=signal_label,
-    )
+
+def read_singleimg_nxs(fname, sasdata="", lazy=False):
+    """
+    Read a single image from a .nxs file.
+
+    With lazy=True, the intensity is a dask array that reads from a shared
+    pool of file handles, and the file is closed when the array is garbage
+    collected or ``close()`` is called on it. Lazy arrays may be pickled.
+    """
+    return _read_nxdata(fname, _singleimg_group(sasdata), lazy)
+
+
+def _singleimg_group(sasdata):
+    if sasdata:
+        return "sasdata_singleimg" + "_" + sasdata
+    return "sasdata_singleimg"
+
+
+def _read_nxdata(fname, sasdata, lazy):
+    "Read the signal of an NXdata group, with its axes, as a DataArray."
     if lazy:
-        da.attrs["lazy"] = True
-        da.attrs["h5"] = h5
-        return da
+        signal_label, signal, labels, coords, _ = _lazy_signal(fname, sasdata)
     else:
-        da.attrs["lazy"] = False
-        return da
+        with h5py.File(fname, "r") as h5:
+            if sasdata not in h5["entry"]:
+                raise ValueError(f'sasdata "{sasdata}" not found in {fname}')
+            group = h5["entry"][sasdata]
+            signal_label = group.attrs["signal"]
+            signal = group[signal_label][()]
+            labels = group.attrs["I_axes"].split(",")
+            coords = {label: group[label][()] for label in labels}
+
+    da = xr.DataArray(signal, dims=labels, coords=coords, name=signal_label)
+    da.attrs["lazy"] = lazy
+    if lazy:
+        da.set_close(functools.partial(_close_files, [fname]))
+    return da
 
 
 def writeImageEnergySeries(
@@ -252,129 +510,598 @@ def writeImageEnergySeries(
     chi=False,
     simulation_variables=None,
     group_name_mod="",
+    *,
+    chunks=None,
+    compression="gzip",
+    compression_opts=4,
+    shuffle=True,
 ):
+    """
+    Write a series of images, one per energy, as an NXdata group.
+
+    Images are written as they are consumed from da_image_list, which may be
+    a generator, so the full series never has to be in memory at once.
+
+    Parameters
+    ----------
+    fileName : str or Path
+    da_image_list : iterable of xarray.DataArray
+        One 2D image per energy, with Qx, Qy (or Chi, Q if chi) coordinates
+    energies : sequence
+    chi : bool, optional
+    simulation_variables : dict, optional
+    group_name_mod : str, optional
+        Suffix for the group name, "sasdata_energyseries"
+    chunks : tuple, optional
+        HDF5 chunk shape of the (y, x, energy) intensity, or True to let
+        h5py choose. Default is one energy per chunk, with images tiled in
+        blocks of up to 256 x 256.
+    compression : {"gzip", "lzf", None}, optional
+        HDF5 compression filter. Default is "gzip".
+    compression_opts : int, optional
+        gzip level, 0-9. Default is 4, which compresses simulated intensities
+        nearly as well as 9 in a fraction of the time.
+    shuffle : bool, optional
+        Apply the byte-shuffle filter, which makes floating-point data much
+        more compressible. True by default.
+    """
+    with NexusSession(fileName, simulation_variables) as nxs:
+        nxs.write_energy_series(
+            da_image_list,
+            energies,
+            chi=chi,
+            group_name_mod=group_name_mod,
+            chunks=chunks,
+            compression=compression,
+            compression_opts=compression_opts,
+            shuffle=shuffle,
+        )
 
-    fileName = pathlib.Path(fileName)
-    if not fileName.exists():
-        initNexus(fileName, simulation_variables)
-
-    if simulation_variables is not None:
-        checkFile(fileName, simulation_variables)
 
-    dataArray = xr.concat(da_image_list, dim="Energy").assign_coords(Energy=energies)
+def _write_energy_series(
+    nxentry,
+    group_name,
+    da_image_list,
+    energies,
+    *,
+    chi,
+    chunks,
+    compression,
+    compression_opts,
+    shuffle,
+):
+    "Stream images into a new NXdata group of an open NXentry."
+    energies = np.asarray(energies)
+    if compression != "gzip":
+        compression_opts = None
+    try:
+        count = len(da_image_list)
+    except TypeError:
+        pass  # an iterator, checked as the images arrive
+    else:
+        if count != len(energies):
+            raise ValueError(f"Got {count} images for {len(energies)} energies.")
+
+    # create the NXdata group for I(Qx,Qy)
+    nxdata = nxentry.create_group(group_name)
+    try:
+        _fill_energy_series(
+            nxdata,
+            da_image_list,
+            energies,
+            chi=chi,
+            chunks=chunks,
+            compression=compression,
+            compression_opts=compression_opts,
+            shuffle=shuffle,
+        )
+    except BaseException:
+        # Leave no half-written group behind, so that the write can be retried.
+        del nxentry[group_name]
+        raise
 
-    # create the HDF5 NeXus file
-    with h5py.File(fileName, "a") as f:
-        timestamp = "T".join(str(datetime.datetime.now()).split())
-        f.attrs["file_time"] = timestamp
 
-        # create the NXdata group for I(Qx,Qy)
-        nxentry = f["entry"]
-        nxdata = nxentry.create_group("sasdata_energyseries" + group_name_mod)
-        nxdata.attrs["NX_class"] = "NXdata"
-        nxdata.attrs["canSAS_class"] = "SASdata"
-        nxdata.attrs["signal"] = "I"  # Y axis of default plot
-        nxdata.attrs["Q_indices"] = "[0,1]"  # use "mr" as the first dimension of I00
+def _fill_energy_series(
+    nxdata,
+    da_image_list,
+    energies,
+    *,
+    chi,
+    chunks,
+    compression,
+    compression_opts,
+    shuffle,
+):
+    "Write the images, axes and attributes of an energy series NXdata group."
+    nxdata.attrs["NX_class"] = "NXdata"
+    nxdata.attrs["canSAS_class"] = "SASdata"
+    nxdata.attrs["signal"] = "I"  # Y axis of default plot
+    nxdata.attrs["Q_indices"] = "[0,1]"  # use "mr" as the first dimension of I00
+
+    ds = None
+    block = []
+    count = 0
+    for image in da_image_list:
+        if ds is None:
+            first = image
+            # energy is the last axis
+            shape = image.shape + (len(energies),)
+            if chunks is None:
+                chunks = (min(shape[0], 256), min(shape[1], 256), 1)
+            ds = nxdata.create_dataset(
+                "I",
+                shape=shape,
+                dtype=image.dtype,
+                chunks=chunks,
+                compression=compression,
+                compression_opts=compression_opts,
+                shuffle=shuffle,
+            )
+            depth = ds.chunks[2] if ds.chunks else 1
+        if count == len(energies):
+            raise ValueError(f"Got more images than the {len(energies)} energies.")
+        # Collect a chunk's depth of energies, so that each HDF5 chunk is
+        # compressed once, whole.
+        block.append(np.asarray(image))
+        count += 1
+        if len(block) == depth or count == len(energies):
+            ds[:, :, count - len(block) : count] = np.stack(block, axis=-1)
+            block = []
+    if ds is None:
+        raise ValueError("No images to write.")
+    if count != len(energies):
+        raise ValueError(f"Got {count} images for {len(energies)} energies.")
+
+    ds.attrs["units"] = "arbitrary"
+    ds.attrs[
+        "long_name"
+    ] = "Simulated Intensity (arbitrary units)"  # suggested X axis plot label
+
+    if chi:
+        nxdata.attrs["I_axes"] = "chi,Q,E"  # X axis of default plot
+
+        ds = nxdata.create_dataset("Q", data=first.Q.values)
+        ds.attrs["units"] = "1/angstrom"
+        ds.attrs["long_name"] = "Q (A^-1)"  # suggested Y axis plot label
 
-        data = np.swapaxes(
-            np.swapaxes(dataArray.values, 0, 1), 1, 2
-        )  # move energy axis to end
-        ds = nxdata.create_dataset(
-            "I", data=data, compression="gzip", compression_opts=9
-        )
-        ds.attrs["units"] = "arbitrary"
+        ds = nxdata.create_dataset("chi", data=first.Chi.values)
+        ds.attrs["units"] = "degree"
         ds.attrs[
             "long_name"
-        ] = "Simulated Intensity (arbitrary units)"  # suggested X axis plot label
+        ] = "azimuthal angle chi (deg)"  # suggested Y axis plot labelk
+    else:
+        nxdata.attrs["I_axes"] = "Qx,Qy,E"  # X axis of default plot
 
-        if chi:
-            nxdata.attrs["I_axes"] = "chi,Q,E"  # X axis of default plot
+        ds = nxdata.create_dataset("Qx", data=first.Qx.values)
+        ds.attrs["units"] = "1/angstrom"
+        ds.attrs["long_name"] = "Qx (A^-1)"
 
-            ds = nxdata.create_dataset("Q", data=dataArray.Q.values)
-            ds.attrs["units"] = "1/angstrom"
-            ds.attrs["long_name"] = "Q (A^-1)"  # suggested Y axis plot label
+        ds = nxdata.create_dataset("Qy", data=first.Qy.values)
+        ds.attrs["units"] = "1/angstrom"
+        ds.attrs["long_name"] = "Qy (A^-1)"
 
-            ds = nxdata.create_dataset("chi", data=dataArray.Chi.values)
-            ds.attrs["units"] = "degree"
-            ds.attrs[
-                "long_name"
-            ] = "azimuthal angle chi (deg)"  # suggested Y axis plot labelk
-        else:
-            nxdata.attrs["I_axes"] = "Qx,Qy,E"  # X axis of default plot
+    ds = nxdata.create_dataset("E", data=energies)
+    ds.attrs["units"] = "eV"
+    ds.attrs["long_name"] = "Simulated Energy (eV)"
 
-            ds = nxdata.create_dataset("Qx", data=dataArray.Qx.values)
-            ds.attrs["units"] = "1/angstrom"
-            ds.attrs["long_name"] = "Qx (A^-1)"
 
-            ds = nxdata.create_dataset("Qy", data=dataArray.Qy.values)
-            ds.attrs["units"] = "1/angstrom"
-            ds.attrs["long_name"] = "Qy (A^-1)"
+def read_energyseries(fname, remesh=False, chi=False, lazy=False):
+    """
+    Read an energy series of images from a .nxs file.
 
-        ds = nxdata.create_dataset("E", data=dataArray.Energy.values)
-        ds.attrs["units"] = "eV"
-        ds.attrs["long_name"] = "Simulated Energy (eV)"
+    See :func:`read_singleimg_nxs` for lazy reading.
+    """
+    return _read_nxdata(fname, _energyseries_group(remesh, chi), lazy)
 
 
-def read_energyseries(fname, remesh=False, chi=False, lazy=False):
+def _energyseries_group(remesh, chi):
     if chi and remesh:
         raise ValueError("No remeshed chi stored in file.")
     elif chi:
-        sasdata = "sasdata_energyseries_chi"
+        return "sasdata_energyseries_chi"
     elif remesh:
-        sasdata = "sasdata_energyseries_remesh"
+        return "sasdata_energyseries_remesh"
     else:
-        sasdata = "sasdata_energyseries"
+        return "sasdata_energyseries"
 
-    h5 = h5py.File(fname, "r")
-    if sasdata not in h5["entry"]:
-        raise ValueError(f'Single image sasdata "{sasdata}" not found in {fname}')
 
-    signal_label = h5["entry"][sasdata].attrs["signal"]
-    if lazy:
-        warnings.warn(
-            "Using delayed,lazy loading for intensity data. USER IS RESPONSIBLE FOR CLOSING THE H5 FILE."
-        )
-        signal = dask.array.from_array(h5["entry"][sasdata][signal_label])
-    else:
-        signal = h5["entry"][sasdata][signal_label][()]
-
-    ylabel, xlabel, zlabel = h5["entry"][sasdata].attrs["I_axes"].split(",")
-    z = h5["entry"][sasdata][zlabel][()]
-    y = h5["entry"][sasdata][ylabel][()]
-    x = h5["entry"][sasdata][xlabel][()]
-
-    da = xr.DataArray(
-        signal,
-        dims=[ylabel, xlabel, zlabel],
-        coords={ylabel: y, xlabel: x, zlabel: z},
-        name=signal_label,
-    )
-    if lazy:
-        da.attrs["lazy"] = True
-        da.attrs["h5"] = h5
-        return da
-    else:
-        da.attrs["lazy"] = False
-        return da
+def _read_notes(nxs_file):
+    with h5py.File(nxs_file, "r") as nxs:
+        notes = nxs["entry/instrument/simulation_engine/notes"]
+        return {k: v[()] for k, v in notes.items()}
+
+
+class _NotesCache:
+    """
+    Simulation notes of .nxs files, persisted in sqlite.
+
+    Entries are keyed by absolute path and are valid only while the file's
+    mtime and size are unchanged.
+    """
+
+    def __init__(self, path):
+        import sqlite3
+
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), timeout=60)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS notes "
+                "(path TEXT PRIMARY KEY, directory TEXT, mtime REAL, size INTEGER, "
+                "config BLOB)"
+            )
 
+    def load(self, directory):
+        "Return {path: (mtime, size, config)} for files cached from directory."
+        import pickle
 
-def build_pandas_index(nxs_path, prog_bar=True):
+        rows = self._conn.execute(
+            "SELECT path, mtime, size, config FROM notes WHERE directory = ?",
+            (str(directory),),
+        )
+        return {
+            path: (mtime, size, pickle.loads(config))
+            for path, mtime, size, config in rows
+        }
+
+    def store(self, directory, entries, keep):
+        """
+        Save {path: (mtime, size, config)} entries and forget any other
+        files from directory that are not in keep.
+        """
+        import pickle
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?)",
+                [
+                    (path, str(directory), mtime, size, pickle.dumps(config))
+                    for path, (mtime, size, config) in entries.items()
+                ],
+            )
+            rows = self._conn.execute(
+                "SELECT path FROM notes WHERE directory = ?", (str(directory),)
+            )
+            stale = {path for path, in rows} - set(keep)
+            self._conn.executemany(
+                "DELETE FROM notes WHERE path = ?", [(path,) for path in stale]
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def build_pandas_index(nxs_path, prog_bar=True, *, processes=None, cache_path=None):
+    """
+    Tabulate the simulation variables of every .nxs file in a directory.
+
+    Notes are read in parallel across processes, and saved in a persistent
+    cache so that later calls only open new or changed files.
+
+    Parameters
+    ----------
+    nxs_path : str or Path
+        Directory of .nxs files
+    prog_bar : bool, optional
+        Display an ipywidgets progress bar. True by default.
+    processes : int, optional
+        Number of worker processes. Default is the number of CPUs. Pass 1 to
+        read in this process.
+    cache_path : str or Path or False, optional
+        sqlite file in which to cache notes. Defaults to a file in the user
+        cache directory. Pass False to disable caching.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per file, with a column per simulation variable and an
+        "nxs" column of paths
+    """
     nxs_path = pathlib.Path(nxs_path)
     nxs_files = list(nxs_path.glob("*nxs"))
+    directory = nxs_path.resolve()
+
+    cache = None
+    if cache_path is not False:
+        if cache_path is None:
+            import appdirs
+
+            cache_path = pathlib.Path(
+                appdirs.user_cache_dir("bluesky", "tutorial_utils"), "nxs_notes.sqlite"
+            )
+        cache = _NotesCache(cache_path)
+
+    keys = {}
+    for nxs_file in nxs_files:
+        stat = nxs_file.stat()
+        keys[nxs_file] = (str(nxs_file.resolve()), stat.st_mtime, stat.st_size)
+    cached = cache.load(directory) if cache is not None else {}
+    configs = {}
+    for nxs_file, (path, mtime, size) in keys.items():
+        entry = cached.get(path)
+        if entry is not None and entry[:2] == (mtime, size):
+            configs[nxs_file] = entry[2]
+    to_read = [nxs_file for nxs_file in nxs_files if nxs_file not in configs]
 
     if prog_bar:
         import ipywidgets
 
-        progress = ipywidgets.IntProgress(0, 0, len(nxs_files))
+        progress = ipywidgets.IntProgress(len(configs), 0, len(nxs_files))
         display(progress)
 
+    workers = max(min(processes or os.cpu_count(), len(to_read)), 1)
+    if workers == 1:
+        for nxs_file in to_read:
+            configs[nxs_file] = _read_notes(nxs_file)
+            if prog_bar:
+                progress.value += 1
+    else:
+        import concurrent.futures
+
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = {
+                executor.submit(_read_notes, nxs_file): nxs_file
+                for nxs_file in to_read
+            }
+            for future in concurrent.futures.as_completed(futures):
+                configs[futures[future]] = future.result()
+                if prog_bar:
+                    progress.value += 1
+
+    if cache is not None:
+        new = {keys[f][0]: keys[f][1:] + (configs[f],) for f in to_read}
+        cache.store(directory, new, keep=[key[0] for key in keys.values()])
+        cache.close()
+
     index_table = []
-    for i, nxs_file in enumerate(nxs_files):
-        if prog_bar:
-            progress.value = i
-        with h5py.File(nxs_file, "r") as nxs:
-            notes = nxs["entry/instrument/simulation_engine/notes"]
-            config = {k: v[()] for k, v in notes.items()}
-            config["nxs"] = nxs_file
-            index_table.append(config)
+    for nxs_file in nxs_files:
+        config = dict(configs[nxs_file])
+        config["nxs"] = nxs_file
+        index_table.append(config)
     return pd.DataFrame(index_table)
+
+
+class _FilePool:
+    """
+    Read-only h5py.File handles, opened on demand and shared by lazy arrays.
+
+    Each lazy array owns a reference to its file. A file is closed when its
+    last owner is garbage collected, or when more than max_open files are
+    open and it is the least recently used one; an owner reading it later
+    reopens it transparently. Files are never closed mid-read, and handles
+    are never shared across processes: a forked child reopens its own.
+    """
+
+    def __init__(self, max_open=64):
+        self.max_open = max_open
+        self._files = collections.OrderedDict()
+        self._owners = collections.Counter()
+        self._in_use = collections.Counter()
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+
+    def acquire(self, path):
+        "Register an owner of path."
+        with self._lock:
+            self._owners[str(path)] += 1
+
+    def release(self, path):
+        "Unregister an owner of path, closing the file if it was the last."
+        path = str(path)
+        with self._lock:
+            if self._owners[path] > 1:
+                self._owners[path] -= 1
+                return
+            del self._owners[path]
+            self._close_idle(path)
+
+    @contextlib.contextmanager
+    def open(self, path):
+        path = str(path)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Handles inherited through fork are not safe to use.
+                self._files.clear()
+                self._in_use.clear()
+                self._pid = os.getpid()
+            try:
+                h5 = self._files[path]
+                self._files.move_to_end(path)
+            except KeyError:
+                h5 = self._files[path] = h5py.File(path, "r")
+                self._evict()
+            self._in_use[path] += 1
+        try:
+            yield h5
+        finally:
+            with self._lock:
+                self._in_use[path] -= 1
+                if not self._in_use[path]:
+                    del self._in_use[path]
+                if path not in self._owners:
+                    self._close_idle(path)
+                self._evict()
+
+    def _close_idle(self, path):
+        if path in self._files and path not in self._in_use:
+            self._files.pop(path).close()
+
+    def _evict(self):
+        for path in list(self._files):
+            if len(self._files) <= self.max_open:
+                break
+            self._close_idle(path)
+
+    def close(self, paths=None):
+        """
+        Close the given files, or all files, except those being read.
+
+        Their owners can still read them; they will be reopened on demand.
+        """
+        with self._lock:
+            for path in list(self._files) if paths is None else map(str, paths):
+                self._close_idle(path)
+
+    def __len__(self):
+        return len(self._files)
+
+
+_file_pool = _FilePool()
+
+
+def set_max_open_files(max_open):
+    """
+    Limit how many .nxs files lazy arrays hold open at once. Default is 64.
+    """
+    with _file_pool._lock:
+        _file_pool.max_open = max_open
+        _file_pool._evict()
+
+
+def _close_files(paths):
+    # A module-level function, unlike a lambda, survives pickling.
+    _file_pool.close(paths)
+
+
+class _LazyH5Dataset:
+    """
+    An array-like view of an HDF5 dataset that opens the file only to read.
+
+    It holds a path rather than a handle, so it can be pickled and read in
+    other processes, where it becomes an owner of the file in that process's
+    pool.
+    """
+
+    def __init__(self, path, name, shape, dtype):
+        self.path = str(path)
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.ndim = len(shape)
+        _file_pool.acquire(self.path)
+        weakref.finalize(self, _file_pool.release, self.path)
+
+    def __reduce__(self):
+        return type(self), (self.path, self.name, self.shape, self.dtype)
+
+    def __getitem__(self, key):
+        with _file_pool.open(self.path) as h5:
+            return h5[self.name][key]
+
+
+def _lazy_signal(path, sasdata, chunks=None):
+    """
+    Return the signal label, dask array, axis labels, coords and attrs of the
+    signal of an NXdata group.
+
+    Unless chunks are given, the dask chunks are whole multiples of the HDF5
+    chunks, so that no HDF5 chunk is decompressed by more than one task.
+    """
+    import dask.array
+    from dask.base import tokenize
+
+    with _file_pool.open(path) as h5:
+        if sasdata not in h5["entry"]:
+            raise ValueError(f'sasdata "{sasdata}" not found in {path}')
+        group = h5["entry"][sasdata]
+        signal_label = group.attrs["signal"]
+        ds = group[signal_label]
+        shape, dtype, h5_chunks = ds.shape, ds.dtype, ds.chunks
+        attrs = dict(ds.attrs)
+        labels = group.attrs["I_axes"].split(",")
+        coords = {label: group[label][()] for label in labels}
+    if chunks is None:
+        chunks = dask.array.core.normalize_chunks(
+            "auto", shape, dtype=dtype, previous_chunks=h5_chunks or shape
+        )
+    name = "nexus-" + tokenize(path, os.path.getmtime(path), sasdata, chunks)
+    array = dask.array.from_array(
+        _LazyH5Dataset(path, f"entry/{sasdata}/{signal_label}", shape, dtype),
+        chunks=chunks,
+        name=name,
+        meta=np.empty((0,) * len(shape), dtype),
+    )
+    return signal_label, array, labels, coords, attrs
+
+
+def open_index(index, sasdata="sasdata_energyseries", params=None, chunks=None):
+    """
+    Lazily load every file in an index as one Dataset, stacked by parameter.
+
+    Nothing but coordinates is read up front. Intensities are read, one
+    HDF5-chunk-aligned dask chunk at a time, from a shared pool of file
+    handles that opens files on demand. Call ``close()`` on the result, or
+    use it in a ``with`` block, to close its files.
+
+    Parameters
+    ----------
+    index : pandas.DataFrame
+        As returned by :func:`build_pandas_index`
+    sasdata : str, optional
+        Name of the NXdata group to load, e.g. "sasdata_energyseries_chi"
+        or "sasdata_singleimg". Default is "sasdata_energyseries".
+    params : list of str, optional
+        Simulation variables to stack along. By default, every column of the
+        index that takes more than one value. If the index holds every
+        combination of their values exactly once, each parameter becomes a
+        dimension. Otherwise the files are stacked along a single "sim"
+        dimension, with the parameters as coordinates on it.
+    chunks : optional
+        Dask chunks for each file's intensity, overriding the HDF5-aligned
+        default.
+
+    Returns
+    -------
+    xarray.Dataset
+    """
+    import dask.array
+
+    if params is None:
+        params = [
+            column
+            for column in index.columns
+            if column != "nxs" and index[column].nunique() > 1
+        ]
+    params = list(params)
+    index = index.sort_values(params) if params else index
+    paths = [str(path) for path in index["nxs"]]
+    if not paths:
+        raise ValueError("The index is empty.")
+
+    signal_label, first, labels, coords, attrs = _lazy_signal(
+        paths[0], sasdata, chunks
+    )
+    arrays = [first]
+    for path in paths[1:]:
+        array = _lazy_signal(path, sasdata, chunks)[1]
+        if array.shape != first.shape:
+            raise ValueError(
+                f"{path} has {sasdata} of shape {array.shape}, but "
+                f"{paths[0]} has shape {first.shape}."
+            )
+        arrays.append(array)
+    stacked = dask.array.stack(arrays)
+
+    values = [index[param].to_numpy() for param in params]
+    levels = [pd.unique(v) for v in values]
+    if (
+        params
+        and np.prod([len(level) for level in levels]) == len(index)
+        and not index.duplicated(params).any()
+    ):
+        # Sorted rows of a full grid reshape directly into one axis per param.
+        grid_shape = tuple(len(level) for level in levels)
+        stacked = stacked.reshape(grid_shape + first.shape)
+        dims = params + labels
+        coords.update(zip(params, levels))
+        coords["nxs"] = (params, np.array(paths).reshape(grid_shape))
+    else:
+        dims = ["sim"] + labels
+        coords.update({p: ("sim", v) for p, v in zip(params, values)})
+        coords["nxs"] = ("sim", np.array(paths))
+
+    attrs["lazy"] = True
+    dataset = xr.Dataset({signal_label: (dims, stacked, attrs)}, coords=coords)
+    dataset.set_close(functools.partial(_close_files, paths))
+    return dataset
@@ -17,6 +17,7 @@ setup(
     package_data={
     'bluesky_tutorial_utils': [
         'example_data/*.jsonl',
+        'example_data/index.json',
         ]
     },
 )
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import event_model
+
+from bluesky_tutorial_utils._databroker import _BufferedDocumentWriter
+
+
+def _run_documents(num_events):
+    run = event_model.compose_run()
+    descriptor, compose_event, _ = run.compose_descriptor(
+        name="primary",
+        data_keys={"x": {"source": "sim", "dtype": "number", "shape": []}},
+    )
+    events = [
+        compose_event(data={"x": i}, timestamps={"x": 0.0}, seq_num=i + 1)
+        for i in range(num_events)
+    ]
+    return run, descriptor, events
+
+
+def test_buffered_events_are_written_at_exit(tmp_path):
+    # The interpreter exits while Events are still held in the buffer,
+    # long before max_delay, and without a 'stop'.
+    output = tmp_path / "documents.jsonl"
+    script = f"""
+import json
+from bluesky_tutorial_utils._databroker import _BufferedDocumentWriter
+from test_buffered_writer import _run_documents
+
+def callback(name, doc):
+    with open({str(output)!r}, "a") as file:
+        file.write(json.dumps([name, doc]) + "\\n")
+
+writer = _BufferedDocumentWriter(callback, max_events=100, max_delay=60)
+run, descriptor, events = _run_documents(5)
+writer("start", run.start_doc)
+writer("descriptor", descriptor)
+for event in events:
+    writer("event", event)
+"""
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=str(tmp_path),
+        env={**os.environ, "PYTHONPATH": os.path.dirname(__file__)},
+        check=True,
+        timeout=60,
+    )
+    documents = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [name for name, _ in documents] == ["start", "descriptor", "event_page"]
+    assert documents[-1][1]["seq_num"] == [1, 2, 3, 4, 5]
+
+
+def test_packing_error_is_raised_by_stop():
+    received = []
+    writer = _BufferedDocumentWriter(
+        lambda name, doc: received.append(name), max_delay=60
+    )
+    run, descriptor, events = _run_documents(2)
+    writer("start", run.start_doc)
+    writer("descriptor", descriptor)
+    writer("event", events[0])
+    # An Event that cannot be packed into an EventPage
+    bad_event = dict(events[1])
+    del bad_event["timestamps"]
+    writer("event", bad_event)
+
+    result = []
+
+    def stop():
+        try:
+            writer("stop", run.compose_stop())
+        except Exception as err:
+            result.append(err)
+
+    thread = threading.Thread(target=stop, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "stop() hung after a packing error"
+    (err,) = result
+    assert isinstance(err, KeyError)
+    # The worker survived and handled the 'stop' itself.
+    assert received == ["start", "descriptor", "stop"]
@@ -0,0 +1,253 @@
+import errno
+import hashlib
+import http.server
+import os
+import pathlib
+import shutil
+import threading
+import time
+import zipfile
+
+import pytest
+import requests
+
+from bluesky_tutorial_utils import fetch
+from bluesky_tutorial_utils.fetch import DatasetCache, _download_file, _unpack_zip
+
+
+PAYLOAD = os.urandom(3 * 2 ** 20 + 123)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve PAYLOAD with Range support. The first response is cut off halfway
+    through its body if the server's drop_first flag is set.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            if start >= len(PAYLOAD):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(PAYLOAD)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        body = PAYLOAD[start:]
+        self.send_response(206 if range_header else 200)
+        if range_header:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}"
+            )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.server.drop_first:
+            self.server.drop_first = False
+            self.wfile.write(body[: len(body) // 2])
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.drop_first = False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_port}/data.zip"
+
+
+def test_resume_after_dropped_connection(server, tmp_path):
+    server.drop_first = True
+    target = tmp_path / "data.zip"
+    with pytest.raises(requests.exceptions.RequestException):
+        _download_file(_url(server), target)
+    part = tmp_path / "data.zip.part"
+    assert not target.exists()
+    assert 0 < part.stat().st_size < len(PAYLOAD)
+
+    sha256 = hashlib.sha256(PAYLOAD).hexdigest()
+    assert _download_file(_url(server), target, sha256=sha256) == target
+    assert target.read_bytes() == PAYLOAD
+    assert not part.exists()
+
+
+def test_complete_part_file_is_renamed(server, tmp_path):
+    # As if a previous run died between the last write and the rename
+    target = tmp_path / "data.zip"
+    (tmp_path / "data.zip.part").write_bytes(PAYLOAD)
+    _download_file(_url(server), target)
+    assert target.read_bytes() == PAYLOAD
+
+
+def test_oversized_part_file_restarts(server, tmp_path):
+    target = tmp_path / "data.zip"
+    (tmp_path / "data.zip.part").write_bytes(PAYLOAD + b"junk")
+    _download_file(_url(server), target)
+    assert target.read_bytes() == PAYLOAD
+
+
+def test_length_check(server, tmp_path, monkeypatch):
+    # A server that closes cleanly after a short body, without an error.
+    def short_iter_content(self, chunk_size=1):
+        yield self.raw.read(100)
+
+    monkeypatch.setattr(requests.Response, "iter_content", short_iter_content)
+    target = tmp_path / "data.zip"
+    with pytest.raises(IOError, match="incomplete"):
+        _download_file(_url(server), target)
+    assert not target.exists()
+
+
+def test_sha256_mismatch(server, tmp_path):
+    target = tmp_path / "data.zip"
+    with pytest.raises(IOError, match="Checksum mismatch"):
+        _download_file(_url(server), target, sha256="0" * 64)
+    assert not target.exists()
+    assert not (tmp_path / "data.zip.part").exists()
+
+
+def test_unpack_zip_without_directory_entries(tmp_path):
+    # Many files in each of many directories that the archive does not list
+    # as entries, so the extracting threads all need the same parents.
+    archive = tmp_path / "nested.zip"
+    contents = {
+        f"top/dir{i:02}/file{j}.bin": os.urandom(1024)
+        for i in range(20)
+        for j in range(8)
+    }
+    with zipfile.ZipFile(archive, "w") as zip_ref:
+        for name, data in contents.items():
+            zip_ref.writestr(name, data)
+    for attempt in range(10):
+        dest = tmp_path / f"out{attempt}"
+        _unpack_zip(archive, dest, max_workers=8)
+        for name, data in contents.items():
+            assert (dest / name).read_bytes() == data
+
+
+class _Archives(dict):
+    "Local zip archives by URL, and the URLs downloaded so far"
+
+    downloads = None
+
+
+@pytest.fixture
+def archives(tmp_path, monkeypatch):
+    "Serve three zip archives of 64 KiB each in place of real downloads."
+    archives = _Archives()
+    archives.downloads = []
+    for name in ("a", "b", "c"):
+        archive = tmp_path / "archives" / f"{name}.zip"
+        archive.parent.mkdir(exist_ok=True)
+        with zipfile.ZipFile(archive, "w") as zip_ref:
+            zip_ref.writestr(f"{name}/one.bin", os.urandom(32 * 1024))
+            zip_ref.writestr(f"{name}/sub/two.bin", os.urandom(32 * 1024))
+        archives[f"https://example.com/{name}.zip"] = archive
+
+    def download_file(url, local_filename, sha256=None):
+        archives.downloads.append(url)
+        time.sleep(0.1)  # long enough for concurrent requests to overlap
+        shutil.copyfile(archives[url], local_filename)
+
+    monkeypatch.setattr(fetch, "_download_file", download_file)
+    return archives
+
+
+def test_cache_concurrent_fetch_downloads_once(tmp_path, archives):
+    cache = DatasetCache(tmp_path / "cache")
+    url = "https://example.com/a.zip"
+    results = []
+
+    def work():
+        # Each thread has its own cache object, as each kernel would.
+        results.append(DatasetCache(tmp_path / "cache").fetch(url))
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert archives.downloads == [url]
+    assert len(set(results)) == 1
+    assert (results[0] / "a" / "sub" / "two.bin").is_file()
+    assert cache.fetch(url) == results[0]
+    assert archives.downloads == [url]
+    # Only the extracted data are kept.
+    assert list((tmp_path / "cache" / "downloads").iterdir()) == []
+
+
+def test_cache_evicts_least_recently_used(tmp_path, archives):
+    # Room for two of the 64 KiB datasets, not three
+    cache = DatasetCache(tmp_path / "cache", max_bytes=150 * 1024)
+    a, b, c = archives
+    data_a = cache.fetch(a)
+    data_b = cache.fetch(b)
+    cache.fetch(a)  # a is now used more recently than b
+    data_c = cache.fetch(c)
+    assert data_a.exists()
+    assert not data_b.exists()
+    assert data_c.exists()
+    assert archives.downloads == [a, b, c]
+    # b is downloaded again when next asked for; a has become the oldest.
+    assert cache.fetch(b) == data_b
+    assert archives.downloads == [a, b, c, b]
+    assert not data_a.exists()
+    assert sorted(p.name for p in (tmp_path / "cache" / "data").iterdir()) == sorted(
+        [data_b.name, data_c.name]
+    )
+
+
+def test_materialize_hardlinks(tmp_path, archives):
+    cache = DatasetCache(tmp_path / "cache")
+    url = "https://example.com/a.zip"
+    files = cache.materialize(url, tmp_path / "dest")
+    assert sorted(files) == sorted(
+        [pathlib.Path("a/one.bin"), pathlib.Path("a/sub/two.bin")]
+    )
+    source = cache.fetch(url)
+    for file in files:
+        target = tmp_path / "dest" / file
+        assert not target.is_symlink()
+        assert os.path.samefile(target, source / file)
+
+
+def test_materialize_falls_back_to_symlinks(tmp_path, archives, monkeypatch):
+    def link(source, target):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(fetch.os, "link", link)
+    cache = DatasetCache(tmp_path / "cache")
+    url = "https://example.com/a.zip"
+    files = cache.materialize(url, tmp_path / "dest")
+    source = cache.fetch(url)
+    for file in files:
+        target = tmp_path / "dest" / file
+        assert target.is_symlink()
+        assert target.read_bytes() == (source / file).read_bytes()
+
+
+def test_materialize_replaces_stale_tmp(tmp_path, archives):
+    # Left behind by an interrupted call from a process with the same pid
+    stale = tmp_path / f".dest.{os.getpid()}.tmp"
+    (stale / "a").mkdir(parents=True)
+    (stale / "a" / "one.bin").write_bytes(b"partial")
+    (stale / "leftover.txt").write_bytes(b"")
+    cache = DatasetCache(tmp_path / "cache")
+    files = cache.materialize("https://example.com/a.zip", tmp_path / "dest")
+    assert not stale.exists()
+    dest = tmp_path / "dest"
+    placed = [path.relative_to(dest) for path in dest.rglob("*") if path.is_file()]
+    assert sorted(placed) == sorted(files)
+    assert (dest / "a" / "one.bin").read_bytes() != b"partial"
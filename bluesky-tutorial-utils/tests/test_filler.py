@@ -0,0 +1,249 @@
+import event_model
+import numpy as np
+import pytest
+
+from bluesky_tutorial_utils import BatchFiller, get_example_catalog
+from bluesky_tutorial_utils._filler import paged_documents
+from bluesky_tutorial_utils._newton import NewtonHandler
+
+
+class _CountingHandler(NewtonHandler):
+    calls = []
+
+    def fill_many(self, datum_kwargs_list):
+        self.calls.append(len(datum_kwargs_list))
+        return super().fill_many(datum_kwargs_list)
+
+
+class _PerDatumHandler:
+    def __init__(self, filename, **kwargs):
+        self._handler = NewtonHandler(filename, **kwargs)
+
+    def __call__(self, gap):
+        return self._handler(gap)
+
+
+def _documents(gaps_per_resource):
+    "Yield the documents of a run whose one EventPage spans the Resources."
+    run = event_model.compose_run()
+    yield "start", run.start_doc
+    datum_ids = []
+    for gaps in gaps_per_resource:
+        resource, compose_datum, _ = run.compose_resource(
+            spec="newton",
+            root="/",
+            resource_path="",
+            resource_kwargs={"radius": 50, "wave_number": 2 * np.pi / 0.4},
+        )
+        yield "resource", resource
+        for gap in gaps:
+            datum = compose_datum(datum_kwargs={"gap": gap})
+            yield "datum", datum
+            datum_ids.append(datum["datum_id"])
+    descriptor, compose_event, _ = run.compose_descriptor(
+        name="primary",
+        data_keys={
+            "image": {
+                "source": "sim",
+                "dtype": "array",
+                "shape": [128, 128],
+                "external": "FILESTORE:",
+            }
+        },
+    )
+    yield "descriptor", descriptor
+    events = [
+        compose_event(
+            data={"image": datum_id},
+            timestamps={"image": 0.0},
+            filled={"image": False},
+            seq_num=i,
+        )
+        for i, datum_id in enumerate(datum_ids, start=1)
+    ]
+    yield "event_page", event_model.pack_event_page(*events)
+
+
+def _fill(filler_class, handler, documents):
+    filler = filler_class({"newton": handler}, inplace=False, coerce="force_numpy")
+    for name, doc in documents:
+        if name != "event_page":
+            filler(name, doc)
+    return filler("event_page", doc)[1]
+
+
+@pytest.mark.parametrize("handler", [_CountingHandler, _PerDatumHandler])
+def test_batch_filler_matches_filler(handler):
+    documents = list(_documents([[0.0, 0.5, 1.0], [2.0, 3.0]]))
+    _CountingHandler.calls.clear()
+    actual = _fill(BatchFiller, handler, documents)
+    expected = _fill(event_model.Filler, NewtonHandler, documents)
+
+    if handler is _CountingHandler:
+        # One call per Resource, not per Datum.
+        assert _CountingHandler.calls == [3, 2]
+    assert actual["filled"] == expected["filled"]
+    assert len(actual["data"]["image"]) == 5
+    for a, b in zip(actual["data"]["image"], expected["data"]["image"]):
+        np.testing.assert_array_equal(a, b)
+    # The input page is left unfilled.
+    (page,) = [doc for name, doc in documents if name == "event_page"]
+    assert page["filled"]["image"] == [False] * 5
+
+
+def test_paged_documents_packs_streams():
+    documents = list(_documents([[0.0, 0.5, 1.0], [2.0, 3.0]]))
+    (page,) = [doc for name, doc in documents if name == "event_page"]
+    # Store the run as one-Event pages interleaved with Datums, as
+    # suitcase does.
+    datums = iter(doc for name, doc in documents if name == "datum")
+    stored = [
+        (name, doc) for name, doc in documents if name not in ("datum", "event_page")
+    ]
+    for event in event_model.unpack_event_page(page):
+        stored.append(("datum", next(datums)))
+        stored.append(("event_page", event_model.pack_event_page(event)))
+
+    repacked = list(paged_documents(iter, stored))
+    names = [name for name, _ in repacked]
+    assert names.count("event_page") == 1
+    assert names.index("event_page") > max(
+        i for i, name in enumerate(names) if name == "datum"
+    )
+    (actual,) = [doc for name, doc in repacked if name == "event_page"]
+    assert actual["seq_num"] == page["seq_num"]
+    assert actual["data"] == page["data"]
+
+
+def test_example_catalog_fills_stream_at_once(monkeypatch):
+    calls = []
+    fill_many = NewtonHandler.fill_many
+
+    def counting_fill_many(self, datum_kwargs_list):
+        calls.append(len(datum_kwargs_list))
+        return fill_many(self, datum_kwargs_list)
+
+    monkeypatch.setattr(NewtonHandler, "fill_many", counting_fill_many)
+    catalog = get_example_catalog()
+    (run, *_) = [
+        run for run in catalog.values() if run.metadata["start"]["plan_name"] == "scan"
+    ]
+    documents = list(run.documents(fill="yes"))
+    # One call for the whole 25-point scan, not one per Event.
+    assert calls == [25]
+    pages = [doc for name, doc in documents if name == "event_page"]
+    images = [image for page in pages for image in page["data"].get("ns_image", [])]
+    assert len(images) == 25
+    assert all(isinstance(image, np.ndarray) for image in images)
+
+
+def test_batch_filler_reads_npy_stack(tmp_path):
+    from bluesky_tutorial_utils._old_handlers import NpyFrameWise
+
+    stack = np.arange(6 * 4 * 4, dtype=float).reshape(6, 4, 4)
+    np.save(tmp_path / "stack.npy", stack)
+    run = event_model.compose_run()
+    resource, compose_datum, _ = run.compose_resource(
+        spec="npy_FRAMEWISE",
+        root=str(tmp_path),
+        resource_path="stack.npy",
+        resource_kwargs={},
+    )
+    descriptor, compose_event, _ = run.compose_descriptor(
+        name="primary",
+        data_keys={
+            "image": {
+                "source": "sim",
+                "dtype": "array",
+                "shape": [4, 4],
+                "external": "FILESTORE:",
+            }
+        },
+    )
+    filler = BatchFiller({"npy_FRAMEWISE": NpyFrameWise}, inplace=False)
+    filler("start", run.start_doc)
+    filler("resource", resource)
+    filler("descriptor", descriptor)
+    events = []
+    for frame_no in [4, 0, 2]:
+        datum = compose_datum(datum_kwargs={"frame_no": frame_no})
+        filler("datum", datum)
+        events.append(
+            compose_event(
+                data={"image": datum["datum_id"]},
+                timestamps={"image": 0.0},
+                filled={"image": False},
+            )
+        )
+    _, page = filler("event_page", event_model.pack_event_page(*events))
+    np.testing.assert_array_equal(np.stack(page["data"]["image"]), stack[[4, 0, 2]])
+
+
+def test_saved_npy_run_fills_stream_at_once(tmp_path, monkeypatch):
+    import appdirs
+
+    from bluesky_tutorial_utils import setup_data_saving
+    from bluesky_tutorial_utils._old_handlers import NpyFrameWise
+
+    calls = []
+    fill_many = NpyFrameWise.fill_many
+
+    def counting_fill_many(self, datum_kwargs_list):
+        calls.append(len(datum_kwargs_list))
+        return fill_many(self, datum_kwargs_list)
+
+    monkeypatch.setattr(NpyFrameWise, "fill_many", counting_fill_many)
+    monkeypatch.setattr(appdirs, "user_data_dir", lambda *args: str(tmp_path / "db"))
+
+    class RunEngine:
+        "Just enough of a RunEngine for setup_data_saving."
+
+        def subscribe(self, callback):
+            self.callback = callback
+
+    RE = RunEngine()
+    catalog = setup_data_saving(RE)
+
+    stack = np.arange(8 * 4 * 4, dtype=float).reshape(8, 4, 4)
+    np.save(tmp_path / "stack.npy", stack)
+    run = event_model.compose_run()
+    RE.callback("start", run.start_doc)
+    resource, compose_datum, _ = run.compose_resource(
+        spec="npy_FRAMEWISE",
+        root=str(tmp_path),
+        resource_path="stack.npy",
+        resource_kwargs={},
+    )
+    RE.callback("resource", resource)
+    descriptor, compose_event, _ = run.compose_descriptor(
+        name="primary",
+        data_keys={
+            "image": {
+                "source": "sim",
+                "dtype": "array",
+                "shape": [4, 4],
+                "external": "FILESTORE:",
+            }
+        },
+    )
+    RE.callback("descriptor", descriptor)
+    for frame_no in range(len(stack)):
+        datum = compose_datum(datum_kwargs={"frame_no": frame_no})
+        RE.callback("datum", datum)
+        RE.callback(
+            "event",
+            compose_event(
+                data={"image": datum["datum_id"]},
+                timestamps={"image": 0.0},
+                filled={"image": False},
+                seq_num=frame_no + 1,
+            ),
+        )
+    RE.callback("stop", run.compose_stop())
+
+    documents = list(catalog[run.start_doc["uid"]].documents(fill="yes"))
+    # One call for the whole stream, not one per frame.
+    assert calls == [len(stack)]
+    pages = [doc for name, doc in documents if name == "event_page"]
+    images = [image for page in pages for image in page["data"]["image"]]
+    np.testing.assert_array_equal(np.stack(images), stack)
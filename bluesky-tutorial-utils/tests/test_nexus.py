@@ -0,0 +1,93 @@
+import gc
+import pickle
+
+import h5py
+import numpy as np
+import pytest
+import xarray as xr
+
+from bluesky_tutorial_utils import nexus
+
+
+def _images(num_images):
+    rng = np.random.default_rng(0)
+    coords = {"Qx": np.linspace(-0.1, 0.1, 8), "Qy": np.linspace(-0.1, 0.1, 6)}
+    return [
+        xr.DataArray(rng.random((8, 6)), dims=["Qx", "Qy"], coords=coords)
+        for _ in range(num_images)
+    ]
+
+
+@pytest.mark.parametrize("container", [list, iter])
+@pytest.mark.parametrize("num_images", [3, 5])
+def test_energy_series_mismatch_leaves_no_group(tmp_path, container, num_images):
+    fname = tmp_path / "sim.nxs"
+    energies = np.linspace(270, 290, 4)
+    with pytest.raises(ValueError, match="energies"):
+        nexus.writeImageEnergySeries(fname, container(_images(num_images)), energies)
+    with h5py.File(fname, "r") as file:
+        groups = list(file["entry"])
+    assert not [name for name in groups if name.startswith("sasdata_energyseries")]
+    # The failed write does not get in the way of a retry.
+    images = _images(len(energies))
+    nexus.writeImageEnergySeries(fname, images, energies)
+    actual = nexus.read_energyseries(fname)
+    np.testing.assert_array_equal(
+        actual.values, np.stack([image.values for image in images], axis=-1)
+    )
+
+
+@pytest.fixture
+def nxs_files(tmp_path):
+    "Three energy series files, with the file pool restored afterwards"
+    energies = np.linspace(270, 290, 4)
+    fnames = []
+    for i in range(3):
+        fname = tmp_path / f"sim{i}.nxs"
+        nexus.writeImageEnergySeries(fname, _images(len(energies)), energies)
+        fnames.append(fname)
+    yield fnames
+    nexus.set_max_open_files(64)
+    nexus._file_pool.close()
+
+
+def test_lazy_file_closed_when_array_is_collected(nxs_files):
+    fname = str(nxs_files[0])
+    da = nexus.read_energyseries(fname, lazy=True)
+    assert da.attrs == {"lazy": True}  # no h5py handle to keep the file open
+    expected = nexus.read_energyseries(fname)
+    np.testing.assert_array_equal(da.values, expected.values)
+    assert fname in nexus._file_pool._files
+    copy = da.copy()
+    del da
+    gc.collect()
+    # Another array still owns the file.
+    assert fname in nexus._file_pool._files
+    del copy
+    gc.collect()
+    assert fname not in nexus._file_pool._files
+
+
+def test_lazy_files_beyond_max_open_are_reopened(nxs_files):
+    nexus.set_max_open_files(2)
+    arrays = [nexus.read_energyseries(fname, lazy=True) for fname in nxs_files]
+    for da in arrays:
+        da.compute()
+        assert len(nexus._file_pool) <= 2
+    # The least recently used file was closed, and is read again on demand.
+    assert str(nxs_files[0]) not in nexus._file_pool._files
+    expected = nexus.read_energyseries(nxs_files[0])
+    np.testing.assert_array_equal(arrays[0].values, expected.values)
+    assert str(nxs_files[0]) in nexus._file_pool._files
+    assert len(nexus._file_pool) == 2
+    nexus.set_max_open_files(1)
+    assert len(nexus._file_pool) == 1
+
+
+def test_lazy_array_pickles_and_reads_in_processes(nxs_files):
+    dask = pytest.importorskip("dask")
+    da = nexus.read_energyseries(nxs_files[0], lazy=True)
+    expected = nexus.read_energyseries(nxs_files[0])
+    xr.testing.assert_equal(pickle.loads(pickle.dumps(da)).compute(), expected)
+    (actual,) = dask.compute(da, scheduler="processes")
+    xr.testing.assert_equal(actual, expected)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from bluesky_tutorial_utils import nexus
+
+pytest.importorskip("zarr")
+
+SIMULATION_VARIABLES = {"angle": 45.0, "Energy": 280.0}
+
+
+@pytest.fixture
+def stores(tmp_path):
+    "The same groups, written once as .nxs and once as Zarr"
+    rng = np.random.default_rng(0)
+    qx, qy = np.linspace(-0.1, 0.1, 40), np.linspace(-0.1, 0.1, 30)
+    energies = np.linspace(270, 290, 6)
+    coords = {"Qx": qx, "Qy": qy}
+    images = [
+        xr.DataArray(rng.random((40, 30)), dims=["Qx", "Qy"], coords=coords)
+        for _ in energies
+    ]
+    nxs = tmp_path / "sim.nxs"
+    store = tmp_path / "sim.zarr"
+    nexus.writeSingleImageQxQy(nxs, images[0].values, qx, qy, SIMULATION_VARIABLES)
+    nexus.writeImageEnergySeries(nxs, images, energies)
+    nexus.write_qxqy_zarr(store, images[0].values, qx, qy, SIMULATION_VARIABLES)
+    nexus.write_energy_series_zarr(store, images, energies)
+    return nxs, store
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_singleimg_round_trip(stores, lazy):
+    nxs, store = stores
+    expected = nexus.read_singleimg_nxs(nxs, lazy=lazy)
+    actual = nexus.read_singleimg_zarr(store, lazy=lazy)
+    xr.testing.assert_identical(actual.compute(), expected.compute())
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_energyseries_round_trip(stores, lazy):
+    nxs, store = stores
+    expected = nexus.read_energyseries(nxs, lazy=lazy)
+    actual = nexus.read_energyseries_zarr(store, lazy=lazy)
+    xr.testing.assert_identical(actual.compute(), expected.compute())
+
+
+def test_simulation_variables_are_checked(stores):
+    _, store = stores
+    with pytest.raises(ValueError, match="checkFile Failed"):
+        nexus.write_qxqy_zarr(
+            store, np.zeros((2, 2)), np.arange(2.0), np.arange(2.0), {"angle": 0.0}
+        )
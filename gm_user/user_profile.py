@@ -12,11 +12,23 @@ from bluesky import SupplementalData
 sd = SupplementalData()
 RE.preprocessors.append(sd)
 
+from bluesky_tutorial_utils import LazyObject, lazy_startup_enabled
+# Set BLUESKY_TUTORIAL_LAZY_IMPORTS=1 to defer slow imports until first use.
+LAZY_IMPORTS = lazy_startup_enabled()
+
 # Set up a Broker.
-from databroker import Broker
-db = Broker.named("temp")
-# and subscribe it to the RunEngine
-RE.subscribe(db.insert)
+if LAZY_IMPORTS:
+    # Importing databroker takes seconds; defer it until the first document.
+    def _make_broker():
+        from databroker import Broker
+        return Broker.named("temp")
+    db = LazyObject(_make_broker, globals(), "db")
+    RE.subscribe(lambda name, doc: db.insert(name, doc))
+else:
+    from databroker import Broker
+    db = Broker.named("temp")
+    # and subscribe it to the RunEngine
+    RE.subscribe(db.insert)
 
 
 from bluesky.magics import BlueskyMagics
@@ -32,6 +44,8 @@ bec = BestEffortCallback()
 RE.subscribe(bec)
 
 
+# Not deferred even with lazy imports: under IPython, where matplotlib is
+# already imported, creating the RunEngine has imported pyplot too.
 import matplotlib.pyplot as plt
 # Make plots update live while scans run.
 from bluesky.utils import install_nb_kicker
@@ -43,6 +57,8 @@ install_nb_kicker()
 # namespace
 import numpy as np
 
+# These are not deferred even with lazy imports: they have been imported
+# already, by bluesky itself, BlueskyMagics and BestEffortCallback.
 import bluesky.callbacks
 from bluesky.callbacks import *
 